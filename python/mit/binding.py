@@ -10,8 +10,8 @@ RISK.
 '''
 
 from ctypes import (
-    CDLL, CFUNCTYPE, POINTER, c_char_p, c_int, c_size_t, c_ssize_t, c_void_p,
-    pointer, sizeof
+    CDLL, CFUNCTYPE, POINTER, c_char_p, c_int, c_size_t, c_ssize_t, c_uint,
+    c_ulong, c_void_p, pointer, sizeof
 )
 from ctypes.util import find_library
 
@@ -109,6 +109,12 @@ stack_words_ptr = pointer(c_uword.in_dll(libmit, "mit_stack_words"))
 stack_words = c_uword.in_dll(libmit, "mit_stack_words")
 run_simple = c_mit_fn.in_dll(libmit, "mit_run_simple")
 run_break = c_mit_fn.in_dll(libmit, "mit_run_break")
+run_callgraph = c_mit_fn.in_dll(libmit, "mit_run_callgraph")
+run_sample = c_mit_fn.in_dll(libmit, "mit_run_sample")
+run_coverage = c_mit_fn.in_dll(libmit, "mit_run_coverage")
+run_heatmap = c_mit_fn.in_dll(libmit, "mit_run_heatmap")
+run_highwater = c_mit_fn.in_dll(libmit, "mit_run_highwater")
+run_trace = c_mit_fn.in_dll(libmit, "mit_run_trace")
 # run_fast = c_mit_fn.in_dll(libmit, "mit_run_fast")
 # run_profile = c_mit_fn.in_dll(libmit, "mit_run_profile")
 
@@ -119,8 +125,40 @@ def run(pc, ir, stack, stack_words, stack_depth_ptr):
 
 # libmit.mit_profile_reset.restype = None
 # libmit.mit_profile_reset.argtypes = None
+# libmit.mit_profile_reset_all.restype = None
+# libmit.mit_profile_reset_all.argtypes = None
 
 # libmit.mit_profile_dump.argtypes = [c_int]
+# libmit.mit_profile_dump_binary.argtypes = [c_int]
+# libmit.mit_profile_dump_all.argtypes = [c_int]
+# libmit.mit_profile_dump_binary_all.argtypes = [c_int]
+
+libmit.mit_callgraph_reset.restype = None
+libmit.mit_callgraph_reset.argtypes = [c_int]
+libmit.mit_callgraph_dump.argtypes = [c_int, c_int]
+libmit.mit_callgraph_dump_edges.argtypes = [c_int]
+
+libmit.mit_sample_start.argtypes = [c_ulong, c_size_t]
+libmit.mit_sample_stop.argtypes = None
+libmit.mit_sample_dump.argtypes = [c_int]
+
+libmit.mit_coverage_reset.argtypes = [c_void_p, c_uword]
+libmit.mit_coverage_bitmap.restype = c_void_p
+libmit.mit_coverage_bitmap.argtypes = None
+libmit.mit_coverage_dump.argtypes = [c_int]
+
+libmit.mit_heatmap_reset.argtypes = [c_void_p, c_size_t, c_uint]
+libmit.mit_heatmap_counts.restype = c_void_p
+libmit.mit_heatmap_counts.argtypes = [POINTER(c_size_t)]
+libmit.mit_heatmap_dump.argtypes = [c_int]
+
+libmit.mit_highwater_reset.restype = None
+libmit.mit_highwater_reset.argtypes = None
+libmit.mit_highwater.restype = None
+libmit.mit_highwater.argtypes = [POINTER(c_uword), POINTER(c_uword)]
+
+libmit.mit_trace_start.argtypes = [c_int]
+libmit.mit_trace_stop.argtypes = None
 
 
 def is_aligned(addr):
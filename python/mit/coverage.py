@@ -0,0 +1,135 @@
+'''
+Coverage bitmaps for Mit code.
+
+Coverage is recorded by `State.run_coverage()` or `mit --coverage`. Run this
+module as a script to merge coverage files and print an annotated
+disassembly:
+
+    python3 -m mit.coverage OBJECT-FILE COVERAGE-FILE...
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import argparse
+import sys
+
+from .binding import Error, word_bytes
+from .disassembler import Disassembler
+from .state import State
+
+# The file format is as written by `mit_coverage_dump()`.
+MAGIC = b'MitCov1\n'
+
+
+class Coverage:
+    '''
+    A coverage bitmap, with one bit for each word of code, counting from
+    the start of the code.
+
+     - words - int - the number of words covered.
+     - bits - bytearray - bit `i % 8` of byte `i // 8` is set if word `i`
+       has been executed.
+    '''
+    def __init__(self, words=0, bits=None):
+        self.words = words
+        self.bits = bits if bits is not None else bytearray((words + 7) // 8)
+        assert len(self.bits) == (words + 7) // 8
+
+    def __contains__(self, index):
+        '''
+        Returns true if word `index` has been executed.
+        '''
+        return 0 <= index < self.words and self.bits[index // 8] & (1 << (index % 8)) != 0
+
+    def count(self):
+        '''
+        Returns the number of words executed.
+        '''
+        return sum(bin(byte).count('1') for byte in self.bits)
+
+    def merge(self, other):
+        '''
+        Add the words executed according to `other`, extending the bitmap if
+        `other` covers more words.
+        '''
+        if other.words > self.words:
+            self.bits.extend(bytes(len(other.bits) - len(self.bits)))
+            self.words = other.words
+        for i, byte in enumerate(other.bits):
+            self.bits[i] |= byte
+        return self
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load coverage from `filename`.
+        '''
+        with open(filename, 'rb') as h:
+            data = h.read()
+        if data[:len(MAGIC)] != MAGIC:
+            raise Error(f"'{filename}' is not a coverage file")
+        words = int.from_bytes(data[8:16], 'little')
+        bits = bytearray(data[16:])
+        if len(bits) != (words + 7) // 8:
+            raise Error(f"coverage file '{filename}' has the wrong length")
+        return cls(words, bits)
+
+    def save(self, filename):
+        '''
+        Save the coverage to `filename`.
+        '''
+        with open(filename, 'wb') as h:
+            h.write(MAGIC)
+            h.write(self.words.to_bytes(8, 'little'))
+            h.write(self.bits)
+
+    def annotate(self, state, length=None, file=sys.stdout):
+        '''
+        Disassemble code at the start of `state.M`, marking each instruction
+        with `+` if its word was executed and `-` if not, then print the
+        number of words executed.
+
+         - length - int - the number of words to disassemble; defaults to
+           the number of words covered.
+        '''
+        if length is None:
+            length = self.words
+        disassembler = Disassembler(state, pc=state.M.start, length=length)
+        for inst in disassembler:
+            index = (disassembler.pc - state.M.start) // word_bytes - 1
+            print(f"{'+' if index in self else '-'} {inst}", file=file)
+        executed = sum(1 for index in range(length) if index in self)
+        percent = 100 * executed / length if length > 0 else 0
+        print(f'{executed} of {length} words executed ({percent:.1f}%)', file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m mit.coverage',
+        description='Merge Mit coverage files and annotate a disassembly.',
+    )
+    parser.add_argument('object_file', metavar='OBJECT-FILE',
+                        help='the object file that was run')
+    parser.add_argument('coverage_files', metavar='COVERAGE-FILE', nargs='+',
+                        help='coverage written by `mit --coverage`')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the merged coverage to FILE')
+    args = parser.parse_args()
+
+    state = State()
+    length = state.load(args.object_file)
+    coverage = Coverage()
+    for filename in args.coverage_files:
+        coverage.merge(Coverage.load(filename))
+    if args.output is not None:
+        coverage.save(args.output)
+    coverage.annotate(state, length)
+
+
+if __name__ == '__main__':
+    main()
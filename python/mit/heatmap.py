@@ -0,0 +1,143 @@
+'''
+Memory heatmaps for Mit code.
+
+Heatmaps are recorded by `State.run_heatmap()` or `mit --heatmap`. Run this
+module as a script to report the most-accessed regions:
+
+    python3 -m mit.heatmap HEATMAP-FILE
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import argparse
+import sys
+from array import array
+
+from .binding import Error
+
+# The access widths counted, in order.
+WIDTHS = ('1', '2', '4', 'word')
+
+
+class Heatmap:
+    '''
+    Counts of memory accesses made by `load` and `store` instructions, for
+    each region of 2**shift bytes.
+
+     - shift - int - log2 of the size of a region.
+     - counts - array of unsigned 64-bit int - COUNTERS counters for each
+       region: reads of each of WIDTHS, then writes likewise; then the
+       counters for accesses outside the regions.
+    '''
+    COUNTERS = 2 * len(WIDTHS)
+
+    def __init__(self, shift, counts):
+        self.shift = shift
+        self.counts = counts
+        assert len(counts) % self.COUNTERS == 0 and len(counts) > 0
+
+    def regions(self):
+        '''
+        Returns the number of regions.
+        '''
+        return len(self.counts) // self.COUNTERS - 1
+
+    def reads(self, region):
+        '''
+        Returns a list of the numbers of reads from `region` of each width
+        in WIDTHS. `region` may be `regions()` for accesses outside the
+        regions.
+        '''
+        i = region * self.COUNTERS
+        return list(self.counts[i:i + len(WIDTHS)])
+
+    def writes(self, region):
+        '''
+        Like `reads()`, but for writes.
+        '''
+        i = region * self.COUNTERS + len(WIDTHS)
+        return list(self.counts[i:i + len(WIDTHS)])
+
+    def to_numpy(self):
+        '''
+        Returns a pair of NumPy arrays `(reads, writes)`, each of shape
+        `(regions() + 1, len(WIDTHS))`, sharing memory with `counts`. The
+        last row is for accesses outside the regions. Requires NumPy.
+        '''
+        import numpy
+        counts = numpy.frombuffer(self.counts, dtype=numpy.uint64)
+        counts = counts.reshape(-1, 2, len(WIDTHS))
+        return counts[:, 0, :], counts[:, 1, :]
+
+    def hottest(self, top=20):
+        '''
+        Returns a list of up to `top` regions with the most accesses, most
+        accessed first, omitting regions with no accesses.
+        '''
+        totals = [
+            (sum(self.counts[i * self.COUNTERS:(i + 1) * self.COUNTERS]), i)
+            for i in range(self.regions())
+        ]
+        totals.sort(key=lambda total: (-total[0], total[1]))
+        return [region for total, region in totals[:top] if total > 0]
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load a heatmap written by `State.save_heatmap()` or `mit --heatmap`.
+        '''
+        with open(filename) as h:
+            header = h.readline().split()
+            if header[:2] != ['#', 'regions'] or header[3] != 'shift':
+                raise Error(f"'{filename}' is not a heatmap file")
+            regions, shift = int(header[2]), int(header[4])
+            counts = array('Q', bytes(8 * (regions + 1) * cls.COUNTERS))
+            for line in h:
+                if line.startswith('#'):
+                    continue
+                offset, *fields = line.split()
+                region = regions if offset == 'outside' else int(offset, 0) >> shift
+                i = region * cls.COUNTERS
+                counts[i:i + cls.COUNTERS] = array('Q', map(int, fields))
+        return cls(shift, counts)
+
+    def report(self, top=20, file=sys.stdout):
+        '''
+        Print the `top` most-accessed regions, with their reads and writes
+        broken down by width.
+        '''
+        def widths(counts):
+            return ' '.join(f'{width}:{count}' for width, count in zip(WIDTHS, counts))
+
+        size = 1 << self.shift
+        print(f'{self.regions()} regions of {size} bytes', file=file)
+        print(f'{"offset":<12} {"reads":>10} {"writes":>10}  reads by width / writes by width', file=file)
+        rows = [(f'{region * size:#x}', region) for region in self.hottest(top)]
+        if sum(self.reads(self.regions()) + self.writes(self.regions())) > 0:
+            rows.append(('outside', self.regions()))
+        for name, region in rows:
+            reads, writes = self.reads(region), self.writes(region)
+            print(f'{name:<12} {sum(reads):>10} {sum(writes):>10}  {widths(reads)} / {widths(writes)}', file=file)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m mit.heatmap',
+        description='Report on a Mit memory heatmap.',
+    )
+    parser.add_argument('heatmap_file', metavar='HEATMAP-FILE',
+                        help='heatmap written by `mit --heatmap`')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of regions to show [default %(default)s]')
+    args = parser.parse_args()
+
+    Heatmap.load(args.heatmap_file).report(args.top)
+
+
+if __name__ == '__main__':
+    main()
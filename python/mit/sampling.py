@@ -0,0 +1,131 @@
+'''
+Reports for Mit's sampling profiler.
+
+Samples are written by `State.save_samples()` or `mit --sample`. Run this
+module as a script to print a report:
+
+    python3 -m mit.sampling SAMPLES-FILE [OBJECT-FILE]
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import argparse
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+from .binding import hex0x_word_width
+from .disassembler import Disassembler
+from .state import State
+
+
+@dataclass
+class Samples:
+    '''
+    Samples from the sampling profiler.
+
+     - samples - list of (int, int) - the address of the instruction word
+       being executed and the call depth, for each sample.
+     - base - int or None - the address of the VM memory when the samples
+       were taken, if known.
+     - dropped - int - the number of samples dropped because the buffer was
+       full.
+    '''
+    samples: list = field(default_factory=list)
+    base: int = None
+    dropped: int = 0
+
+    @classmethod
+    def load(cls, filename):
+        '''
+        Load samples from `filename`.
+        '''
+        result = cls()
+        with open(filename) as h:
+            for line in h:
+                fields = line.split()
+                if fields[0] == '#':
+                    if fields[1:2] == ['base']:
+                        result.base = int(fields[2], 0)
+                    elif fields[1:2] == ['dropped']:
+                        result.dropped = int(fields[2])
+                    continue
+                addr, depth = fields
+                result.samples.append((int(addr, 0), int(depth)))
+        return result
+
+    def addresses(self):
+        '''
+        Returns a Counter of samples by instruction word address.
+        '''
+        return Counter(addr for addr, _ in self.samples)
+
+    def depths(self):
+        '''
+        Returns a Counter of samples by call depth.
+        '''
+        return Counter(depth for _, depth in self.samples)
+
+    def report(self, state=None, top=20, file=sys.stdout):
+        '''
+        Print the `top` most-sampled instruction words, and the distribution
+        of call depths.
+
+         - state - State or None - if given, the code that was sampled,
+           loaded at the start of its memory, which is used to disassemble
+           the sampled words.
+        '''
+        total = len(self.samples)
+        print(f'{total} samples ({self.dropped} dropped)', file=file)
+        if total == 0:
+            return
+        print(file=file)
+        width = hex0x_word_width
+        print(f'{"samples":>8} {"%":>6}  {"address":<{width}}  {"offset":<{width}}  code', file=file)
+        for addr, count in self.addresses().most_common(top):
+            offset = addr - self.base if self.base is not None else None
+            offset_str = f'{offset:#x}' if offset is not None else '?'
+            code = ''
+            if state is not None and offset is not None:
+                code = self._disassemble(state, state.M.start + offset)
+            print(f'{count:>8} {100 * count / total:>6.2f}  {addr:<#{width}x}  {offset_str:<{width}}  {code}', file=file)
+        print(file=file)
+        print(f'{"depth":>8} {"samples":>8} {"%":>6}', file=file)
+        for depth, count in sorted(self.depths().items()):
+            print(f'{depth:>8} {count:>8} {100 * count / total:>6.2f}', file=file)
+
+    @staticmethod
+    def _disassemble(state, addr):
+        if not state.M.start <= addr < state.M.end:
+            return ''
+        instructions = Disassembler(state, pc=addr, length=1)
+        return '; '.join(inst.split(': ', 1)[1] for inst in instructions)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python3 -m mit.sampling',
+        description='Report on samples from the Mit sampling profiler.',
+    )
+    parser.add_argument('samples_file', metavar='SAMPLES-FILE',
+                        help='samples written by `mit --sample`')
+    parser.add_argument('object_file', metavar='OBJECT-FILE', nargs='?',
+                        help='the object file that was run, to disassemble')
+    parser.add_argument('--top', type=int, default=20,
+                        help='number of instruction words to show [default %(default)s]')
+    args = parser.parse_args()
+
+    state = None
+    if args.object_file is not None:
+        state = State()
+        state.load(args.object_file)
+    Samples.load(args.samples_file).report(state, args.top)
+
+
+if __name__ == '__main__':
+    main()
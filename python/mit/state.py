@@ -10,7 +10,10 @@ RISK.
 '''
 
 import sys
-from ctypes import POINTER, byref, c_void_p, cast, create_string_buffer
+from array import array
+from ctypes import (
+    POINTER, byref, c_size_t, c_void_p, cast, create_string_buffer, string_at
+)
 from dataclasses import dataclass
 from types import FunctionType
 
@@ -19,8 +22,9 @@ from .assembler import Assembler
 # from .binding import run_fast
 from .binding import (
     Error, VMError, break_fn_ptr, c_mit_fn, c_uword, c_word, hex0x_word_width,
-    is_aligned, register_args, run, run_break, run_ptr, run_simple,
-    stack_words, uword_max, word_bytes
+    is_aligned, libmit, register_args, run, run_break, run_callgraph,
+    run_coverage, run_heatmap, run_highwater, run_ptr, run_sample, run_simple,
+    run_trace, stack_words, uword_max, word_bytes
 )
 from .disassembler import Disassembler
 from .memory import Memory
@@ -74,6 +78,215 @@ class State:
             byref(c_uword(0)),
         )
 
+    def run_profile(self):
+        '''
+        Like `run()`, but uses the specialized interpreter, and records how
+        often each of its guesses is correct. The profile can then be saved
+        with `save_profile()`. Mit must have been built with the
+        specializer.
+        '''
+        libmit.mit_profile_reset()
+        self.run(run_fn=c_mit_fn.in_dll(libmit, "mit_run_profile"))
+
+    def reset_profile(self, all_threads=False):
+        '''
+        Clear the profile recorded by `run_profile()`.
+
+         - all_threads - bool - if true, clear the profiles of all threads.
+           No other thread may be running `run_profile()` at the time.
+        '''
+        if all_threads:
+            libmit.mit_profile_reset_all()
+        else:
+            libmit.mit_profile_reset()
+
+    def save_profile(self, filename, binary=True, all_threads=False):
+        '''
+        Save the profile recorded by `run_profile()`.
+
+         - filename - str - the file to write.
+         - binary - bool - if true, write the compact binary format;
+           otherwise, write JSON.
+         - all_threads - bool - if true, save the sum of the profiles of all
+           threads, including threads that have exited, rather than just the
+           current thread's. No other thread may be running `run_profile()`
+           at the time.
+        '''
+        if all_threads:
+            dump = libmit.mit_profile_dump_binary_all if binary else libmit.mit_profile_dump_all
+        else:
+            dump = libmit.mit_profile_dump_binary if binary else libmit.mit_profile_dump
+        with open(filename, 'wb') as h:
+            ret = dump(h.fileno())
+        if ret != 0:
+            raise Error(f"error writing profile to '{filename}'")
+
+    def run_callgraph(self, timed=False):
+        '''
+        Like `run()`, but records a call graph of `call` and `catch`, which
+        can then be saved with `save_callgraph()`.
+
+         - timed - bool - if true, also record wall-clock time.
+        '''
+        libmit.mit_callgraph_reset(timed)
+        self.run(run_fn=run_callgraph)
+
+    def save_callgraph(self, filename, timed=False, edges=False):
+        '''
+        Save the call graph recorded by `run_callgraph()`.
+
+         - filename - str - the file to write.
+         - timed - bool - if true, weight stacks by time rather than
+           instructions.
+         - edges - bool - if true, write a table of call edges with their
+           inclusive and exclusive costs instead of folded stacks.
+        '''
+        with open(filename, 'w') as h:
+            if edges:
+                ret = libmit.mit_callgraph_dump_edges(h.fileno())
+            else:
+                ret = libmit.mit_callgraph_dump(h.fileno(), timed)
+        if ret != 0:
+            raise Error(f"error writing call graph to '{filename}'")
+
+    def run_sample(self, interval=1000, max_samples=1 << 20):
+        '''
+        Like `run()`, but samples the instruction being executed and the
+        depth of calls periodically. The samples can then be saved with
+        `save_samples()`, and analysed with the `sampling` module.
+
+         - interval - int - the sampling interval in microseconds of CPU
+           time.
+         - max_samples - int - the number of samples to keep; later samples
+           are dropped.
+        '''
+        if libmit.mit_sample_start(interval, max_samples) != 0:
+            raise Error("could not start sampling")
+        try:
+            self.run(run_fn=run_sample)
+        finally:
+            libmit.mit_sample_stop()
+
+    def save_samples(self, filename):
+        '''
+        Save the samples taken by `run_sample()`.
+
+         - filename - str - the file to write.
+        '''
+        with open(filename, 'w') as h:
+            h.write(f'# base {self.M.start:#x}\n')
+            h.flush()
+            ret = libmit.mit_sample_dump(h.fileno())
+        if ret != 0:
+            raise Error(f"error writing samples to '{filename}'")
+
+    def run_coverage(self):
+        '''
+        Like `run()`, but records which words of `M` are executed. The
+        coverage can then be obtained with `coverage()` or saved with
+        `save_coverage()`.
+        '''
+        if libmit.mit_coverage_reset(self.M.start, len(self.M_word)) != 0:
+            raise Error("could not allocate coverage bitmap")
+        self.run(run_fn=run_coverage)
+
+    def coverage(self):
+        '''
+        Returns a Coverage of `M` recorded by `run_coverage()`.
+        '''
+        from .coverage import Coverage # `coverage` imports this module.
+        words = len(self.M_word)
+        return Coverage(words, bytearray(string_at(
+            libmit.mit_coverage_bitmap(), (words + 7) // 8
+        )))
+
+    def save_coverage(self, filename):
+        '''
+        Save the coverage recorded by `run_coverage()`.
+
+         - filename - str - the file to write.
+        '''
+        with open(filename, 'wb') as h:
+            ret = libmit.mit_coverage_dump(h.fileno())
+        if ret != 0:
+            raise Error(f"error writing coverage to '{filename}'")
+
+    def run_heatmap(self, shift=6):
+        '''
+        Like `run()`, but counts the accesses made to `M` by `load` and
+        `store` instructions. The counts can then be obtained with
+        `heatmap()` or saved with `save_heatmap()`.
+
+         - shift - int - count accesses in regions of 2**shift bytes; the
+           default is a typical cache line of 64 bytes, and 12 gives
+           typical pages.
+        '''
+        if libmit.mit_heatmap_reset(self.M.start, len(self.M), shift) != 0:
+            raise Error("could not allocate memory heatmap")
+        self._heatmap_shift = shift
+        self.run(run_fn=run_heatmap)
+
+    def heatmap(self):
+        '''
+        Returns a Heatmap of `M` recorded by `run_heatmap()`.
+        '''
+        # Import here so that `python3 -m mit.heatmap` works.
+        from .heatmap import Heatmap
+        regions = c_size_t()
+        ptr = libmit.mit_heatmap_counts(byref(regions))
+        if ptr is None:
+            raise Error("no memory heatmap has been recorded")
+        counts = array('Q')
+        counts.frombytes(string_at(ptr, (regions.value + 1) * Heatmap.COUNTERS * 8))
+        return Heatmap(self._heatmap_shift, counts)
+
+    def save_heatmap(self, filename):
+        '''
+        Save the counts recorded by `run_heatmap()`.
+
+         - filename - str - the file to write.
+        '''
+        with open(filename, 'w') as h:
+            ret = libmit.mit_heatmap_dump(h.fileno())
+        if ret != 0:
+            raise Error(f"error writing heatmap to '{filename}'")
+
+    def run_highwater(self):
+        '''
+        Like `run()`, but records the stack high-water mark, which can then
+        be obtained with `highwater()`.
+        '''
+        libmit.mit_highwater_reset()
+        self.run(run_fn=run_highwater)
+
+    def highwater(self):
+        '''
+        Returns a tuple `(depth, calls)` of the greatest stack depth in words
+        reached in any frame, and the greatest nesting of calls made by
+        `call` and `catch`, recorded by `run_highwater()`. A stack size of
+        `depth` words is enough for the run.
+        '''
+        depth, calls = c_uword(), c_uword()
+        libmit.mit_highwater(byref(depth), byref(calls))
+        return depth.value, calls.value
+
+    def run_trace(self, filename):
+        '''
+        Like `run()`, but writes a trace of the instructions executed to a
+        file. See `mit_trace_stop()` in `mit.h` for the file format.
+
+         - filename - str - the file to write.
+        '''
+        with open(filename, 'wb') as h:
+            if libmit.mit_trace_start(h.fileno()) != 0:
+                raise Error("could not start tracing")
+            try:
+                self.run(run_fn=run_trace)
+            finally:
+                ret = libmit.mit_trace_stop()
+        if ret != 0:
+            raise Error(f"error writing trace to '{filename}'")
+
     def step(self, n=1, addr=None, trace=False, step_callback=None, final_callback=None):
         '''
         Single-step for `n` steps, or until `pc`=addr. See class BreakHandler
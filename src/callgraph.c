@@ -0,0 +1,271 @@
+// Call-graph profiler.
+//
+// The profile is a calling-context tree: there is one node for each
+// distinct path of calls from the outermost run, identified by the return
+// address and callee address of each call on the path.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <time.h>
+
+#include "mit/mit.h"
+
+#include "callgraph.h"
+
+
+#define NO_NODE ((size_t)-1)
+
+struct node {
+    size_t parent; // `NO_NODE` for a root
+    size_t first_child;
+    size_t next_sibling;
+    mit_word_t *ret_pc; // return address of the call, `NULL` for a root
+    mit_word_t *addr; // address called
+    unsigned long long calls;
+    unsigned long long instructions; // excluding callees
+    unsigned long long nanoseconds; // including callees
+};
+
+// The tree. A node's index is always greater than its parent's.
+static MIT_THREAD_LOCAL struct node *nodes = NULL;
+static MIT_THREAD_LOCAL size_t nodes_used = 0, nodes_size = 0;
+static MIT_THREAD_LOCAL size_t first_root = NO_NODE;
+static MIT_THREAD_LOCAL size_t current = NO_NODE;
+static MIT_THREAD_LOCAL int timing = 0;
+
+MIT_THREAD_LOCAL unsigned long long callgraph_ticks = 0;
+// The value of `callgraph_ticks` when `current` was last charged.
+static MIT_THREAD_LOCAL unsigned long long charged_ticks = 0;
+
+// Charge the instructions executed since the last charge to `current`.
+static void charge(void)
+{
+    if (current != NO_NODE)
+        nodes[current].instructions += callgraph_ticks - charged_ticks;
+    charged_ticks = callgraph_ticks;
+}
+
+// Find the child of `parent` for a call from `ret_pc` to `addr`, adding it
+// if necessary. Returns `NO_NODE` if memory cannot be allocated.
+static size_t find_or_add(size_t parent, mit_word_t *ret_pc, mit_word_t *addr)
+{
+    size_t head = parent == NO_NODE ? first_root : nodes[parent].first_child;
+    for (size_t i = head; i != NO_NODE; i = nodes[i].next_sibling)
+        if (nodes[i].ret_pc == ret_pc && nodes[i].addr == addr)
+            return i;
+
+    if (nodes_used == nodes_size) {
+        size_t new_size = nodes_size == 0 ? 256 : nodes_size * 2;
+        struct node *new_nodes = realloc(nodes, new_size * sizeof(struct node));
+        if (new_nodes == NULL)
+            return NO_NODE;
+        nodes = new_nodes;
+        nodes_size = new_size;
+    }
+    size_t i = nodes_used++;
+    nodes[i] = (struct node){
+        .parent = parent,
+        .first_child = NO_NODE,
+        .next_sibling = head,
+        .ret_pc = ret_pc,
+        .addr = addr,
+    };
+    if (parent == NO_NODE)
+        first_root = i;
+    else
+        nodes[parent].first_child = i;
+    return i;
+}
+
+int callgraph_active(void)
+{
+    return current != NO_NODE;
+}
+
+void callgraph_enter(struct callgraph_frame *frame, mit_word_t *ret_pc, mit_word_t *addr)
+{
+    charge();
+    frame->caller = current;
+    frame->callee = find_or_add(current, ret_pc, addr);
+    if (frame->callee != NO_NODE)
+        nodes[frame->callee].calls++;
+    else // Out of memory: charge the callee to the caller.
+        frame->callee = current;
+    current = frame->callee;
+    if (timing)
+        clock_gettime(CLOCK_MONOTONIC, &frame->start);
+}
+
+void callgraph_leave(const struct callgraph_frame *frame)
+{
+    charge();
+    if (timing && frame->callee != frame->caller) {
+        struct timespec end;
+        clock_gettime(CLOCK_MONOTONIC, &end);
+        long long elapsed = (end.tv_sec - frame->start.tv_sec) * 1000000000LL +
+            (end.tv_nsec - frame->start.tv_nsec);
+        nodes[frame->callee].nanoseconds += (unsigned long long)elapsed;
+    }
+    current = frame->caller;
+}
+
+void mit_callgraph_reset(int timed)
+{
+    free(nodes);
+    nodes = NULL;
+    nodes_used = nodes_size = 0;
+    first_root = current = NO_NODE;
+    callgraph_ticks = charged_ticks = 0;
+    timing = timed;
+}
+
+// Returns a freshly-allocated array of each node's time excluding its
+// callees, or `NULL` on error. Callees abandoned by an error have no time,
+// so clamp at zero.
+static unsigned long long *exclusive_nanoseconds(void)
+{
+    unsigned long long *self = calloc(nodes_used + 1, sizeof(unsigned long long));
+    if (self == NULL)
+        return NULL;
+    for (size_t i = 0; i < nodes_used; i++)
+        self[i] = nodes[i].nanoseconds;
+    for (size_t i = 0; i < nodes_used; i++) {
+        size_t parent = nodes[i].parent;
+        if (parent != NO_NODE)
+            self[parent] = self[parent] > nodes[i].nanoseconds ?
+                self[parent] - nodes[i].nanoseconds : 0;
+    }
+    return self;
+}
+
+// Open `fd` as a buffered stream.
+static FILE *open_fd(int fd)
+{
+    int dup_fd = dup(fd);
+    if (dup_fd == -1)
+        return NULL;
+    FILE *fp = fdopen(dup_fd, "w");
+    if (fp == NULL)
+        close(dup_fd);
+    return fp;
+}
+
+int mit_callgraph_dump(int fd, int timed)
+{
+    charge();
+    int ret = -1;
+    size_t *path = calloc(nodes_used + 1, sizeof(size_t));
+    unsigned long long *self_ns = timed ? exclusive_nanoseconds() : NULL;
+    FILE *fp = open_fd(fd);
+    if (path == NULL || (timed && self_ns == NULL) || fp == NULL)
+        goto err;
+
+    for (size_t i = 0; i < nodes_used; i++) {
+        unsigned long long weight = timed ? self_ns[i] : nodes[i].instructions;
+        if (weight == 0)
+            continue;
+        size_t depth = 0;
+        for (size_t j = i; j != NO_NODE; j = nodes[j].parent)
+            path[depth++] = j;
+        const char *sep = "";
+        while (depth > 0) {
+            if (fprintf(fp, "%s0x%zx", sep, (size_t)nodes[path[--depth]].addr) < 0)
+                goto err;
+            sep = ";";
+        }
+        if (fprintf(fp, " %llu\n", weight) < 0)
+            goto err;
+    }
+    ret = 0;
+
+ err:
+    if (fp != NULL && fclose(fp) != 0)
+        ret = -1;
+    free(self_ns);
+    free(path);
+    return ret;
+}
+
+// Order node indices by call edge, for `mit_callgraph_dump_edges()`.
+static int compare_edges(const void *a, const void *b)
+{
+    const struct node *x = &nodes[*(const size_t *)a];
+    const struct node *y = &nodes[*(const size_t *)b];
+    if (x->ret_pc != y->ret_pc)
+        return x->ret_pc < y->ret_pc ? -1 : 1;
+    if (x->addr != y->addr)
+        return x->addr < y->addr ? -1 : 1;
+    return 0;
+}
+
+// Returns non-zero if some proper ancestor of node `i` is for the same call
+// edge, so that its inclusive costs are already counted.
+static int is_recursive(size_t i)
+{
+    for (size_t j = nodes[i].parent; j != NO_NODE; j = nodes[j].parent)
+        if (nodes[j].ret_pc == nodes[i].ret_pc && nodes[j].addr == nodes[i].addr)
+            return 1;
+    return 0;
+}
+
+int mit_callgraph_dump_edges(int fd)
+{
+    charge();
+    int ret = -1;
+    unsigned long long *inclusive = calloc(nodes_used + 1, sizeof(unsigned long long));
+    unsigned long long *self_ns = exclusive_nanoseconds();
+    size_t *order = calloc(nodes_used + 1, sizeof(size_t));
+    FILE *fp = open_fd(fd);
+    if (inclusive == NULL || self_ns == NULL || order == NULL || fp == NULL)
+        goto err;
+
+    // Children follow their parents, so accumulate in reverse.
+    for (size_t i = nodes_used; i-- > 0; ) {
+        inclusive[i] += nodes[i].instructions;
+        if (nodes[i].parent != NO_NODE)
+            inclusive[nodes[i].parent] += inclusive[i];
+    }
+    for (size_t i = 0; i < nodes_used; i++)
+        order[i] = i;
+    qsort(order, nodes_used, sizeof(size_t), compare_edges);
+
+    if (fprintf(fp, "# ret_pc\taddr\tcalls\tinclusive_instructions\texclusive_instructions\tinclusive_ns\texclusive_ns\n") < 0)
+        goto err;
+    for (size_t k = 0; k < nodes_used; ) {
+        size_t first = order[k];
+        unsigned long long calls = 0, incl = 0, excl = 0, incl_ns = 0, excl_ns = 0;
+        do {
+            size_t i = order[k];
+            calls += nodes[i].calls;
+            excl += nodes[i].instructions;
+            excl_ns += self_ns[i];
+            if (!is_recursive(i)) {
+                incl += inclusive[i];
+                incl_ns += nodes[i].nanoseconds;
+            }
+        } while (++k < nodes_used && compare_edges(&order[k], &first) == 0);
+        if (fprintf(fp, "0x%zx\t0x%zx\t%llu\t%llu\t%llu\t%llu\t%llu\n",
+                    (size_t)nodes[first].ret_pc, (size_t)nodes[first].addr,
+                    calls, incl, excl, incl_ns, excl_ns) < 0)
+            goto err;
+    }
+    ret = 0;
+
+ err:
+    if (fp != NULL && fclose(fp) != 0)
+        ret = -1;
+    free(order);
+    free(self_ns);
+    free(inclusive);
+    return ret;
+}
@@ -0,0 +1,41 @@
+// Call-graph profiler internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_CALLGRAPH_H
+#define MIT_CALLGRAPH_H
+
+
+#include <time.h>
+
+
+// The number of instructions executed so far; incremented by the
+// instrumented interpreter before each instruction.
+extern MIT_THREAD_LOCAL unsigned long long callgraph_ticks;
+
+// The state saved by `callgraph_enter()` and restored by `callgraph_leave()`.
+struct callgraph_frame {
+    size_t caller; // the node that was current before the call
+    size_t callee; // the node entered by the call
+    struct timespec start; // the time of the call, if timing
+};
+
+// Returns non-zero if a call tree is being recorded, i.e. we are inside
+// `mit_run_callgraph`.
+int callgraph_active(void);
+
+// Record a call from return address `ret_pc` (`NULL` for the outermost
+// run) to `addr`, and make the callee current.
+void callgraph_enter(struct callgraph_frame *frame, mit_word_t *ret_pc, mit_word_t *addr);
+
+// Record the return from the call that filled in `frame`, and make the
+// caller current again. Since `call` unwinds by `longjmp` on error, this
+// may be called with a deeper node current; it is then abandoned.
+void callgraph_leave(const struct callgraph_frame *frame);
+
+#endif
@@ -256,7 +256,7 @@ def run_body(instructions):
         gen_code=gen_instruction_code,
     )
 
-def run_inner_fn(instructions, suffix, instrument):
+def run_inner_fn(instructions, suffix, instrument, setup=None):
     '''
     Generate a `run_inner` function.
 
@@ -264,6 +264,8 @@ def run_inner_fn(instructions, suffix, instrument):
      - suffix - str - the function is named `run_inner_{suffix}`.
      - instrument - Code or str - instrumentation to insert at start of main
        loop.
+     - setup - Code or str - optional code to insert before the main loop,
+       for example to declare variables used by `instrument`.
     '''
     return disable_warnings(
         ['-Wstack-protector', '-Wvla-larger-than='], # TODO: Stack protection cannot cope with VLAs.
@@ -276,9 +278,10 @@ def run_inner_fn(instructions, suffix, instrument):
             Code(*[
                 '''\
                 #define stack_depth (*stack_depth_ptr)
-                mit_word_t error;
-
-                for (;;) {''',
+                mit_word_t error;''',
+                *([setup] if setup is not None else []),
+                '',
+                'for (;;) {',
                 instrument,
                 Code('''\
                     uint8_t opcode = (uint8_t)ir;
@@ -301,23 +304,35 @@ def run_inner_fn(instructions, suffix, instrument):
         )
     )
 
-def run_fn(suffix):
+def run_fn(suffix, prologue=None, epilogue=None):
     '''
     Generate a `mit_run`-like function.
 
      - suffix - str - the function is named `mit_run_{suffix}` and will call
        an inner function `run_inner_{suffix}`.
+     - prologue - optional Code - code to run before the inner function, e.g.
+       to set up instrumentation.
+     - epilogue - optional Code - code to run after the inner function,
+       whether or not it raised an error, which is in `error`.
     '''
-    return Code(f'''
-        mit_word_t mit_run_{suffix}(mit_word_t *pc, mit_word_t ir, mit_word_t * restrict stack, mit_uword_t stack_words, mit_uword_t *stack_depth_ptr)
-        {{
-            jmp_buf env;
-            mit_word_t error = (mit_word_t)setjmp(env);
-            if (error == 0) {{
-                run_inner_{suffix}(pc, ir, stack, stack_words, stack_depth_ptr, &env);
-                error = MIT_ERROR_OK;
-            }}
-            return error;
-        }}
-        ''',
+    body = Code()
+    if prologue is not None:
+        body.extend(prologue)
+    body.append(f'''\
+        jmp_buf env;
+        mit_word_t error = (mit_word_t)setjmp(env);
+        if (error == 0) {{
+            run_inner_{suffix}(pc, ir, stack, stack_words, stack_depth_ptr, &env);
+            error = MIT_ERROR_OK;
+        }}'''
+    )
+    if epilogue is not None:
+        body.extend(epilogue)
+    body.append('return error;')
+    return Code(
+        '',
+        f'mit_word_t mit_run_{suffix}(mit_word_t *pc, mit_word_t ir, mit_word_t * restrict stack, mit_uword_t stack_words, mit_uword_t *stack_depth_ptr)',
+        '{',
+        body,
+        '}',
     )
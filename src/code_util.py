@@ -9,6 +9,8 @@ THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
 RISK.
 '''
 
+import hashlib
+import os
 import re
 import textwrap
 
@@ -39,16 +41,80 @@ class Code:
         '''
         Returns this Code as a str.
         '''
-        return '\n'.join(
-            textwrap.indent(str(x), self.INDENT)
-            if isinstance(x, Code) else str(x)
-            for x in self.buffer
-        )
+        return '\n'.join(self.lines())
+
+    def lines(self):
+        '''
+        Generate the lines of this Code, without newlines. Nested Code is
+        indented, except for lines that are blank. Takes time linear in the
+        size of the output, however deeply Code is nested.
+        '''
+        stack = [(iter(self.buffer), '')]
+        if len(self.buffer) == 0:
+            yield ''
+        while len(stack) > 0:
+            fragments, prefix = stack[-1]
+            fragment = next(fragments, None)
+            if fragment is None:
+                stack.pop()
+            elif isinstance(fragment, Code):
+                if len(fragment.buffer) == 0:
+                    yield ''
+                stack.append((iter(fragment.buffer), prefix + self.INDENT))
+            else:
+                for line in fragment.split('\n'):
+                    yield prefix + line if line.strip() else line
+
+    def write(self, file):
+        '''
+        Write this Code to `file`, followed by a newline, like
+        `print(self, file=file)`, but without first building the output as
+        a single str.
+
+         - file - a text file object.
+        '''
+        for line in self.lines():
+            file.write(line)
+            file.write('\n')
+
+    def save(self, filename):
+        '''
+        Write this Code to the file `filename`, like `write()`, unless the
+        file already has the same content, as determined by comparing
+        hashes. An unchanged file thus keeps its timestamp, so that `make`
+        does not rebuild the files that depend on it.
+
+         - filename - str.
+
+        Returns `True` if the file was written.
+        '''
+        new_hash = hashlib.sha256()
+        for line in self.lines():
+            new_hash.update(line.encode('utf-8'))
+            new_hash.update(b'\n')
+        try:
+            old_hash = hashlib.sha256()
+            with open(filename, 'rb') as h:
+                for block in iter(lambda: h.read(1 << 16), b''):
+                    old_hash.update(block)
+            if old_hash.digest() == new_hash.digest():
+                return False
+        except FileNotFoundError:
+            pass
+        temp_filename = f'{filename}.tmp'
+        with open(temp_filename, 'w', encoding='utf-8') as h:
+            self.write(h)
+        os.replace(temp_filename, filename)
+        return True
 
     def append(self, str_or_code):
         assert isinstance(str_or_code, (Code, str))
         if isinstance(str_or_code, str):
-            str_or_code = textwrap.dedent(str_or_code.rstrip())
+            str_or_code = str_or_code.rstrip()
+            if '\n' in str_or_code:
+                str_or_code = textwrap.dedent(str_or_code)
+            else: # Fast path for the common case.
+                str_or_code = str_or_code.lstrip(' \t')
         self.buffer.append(str_or_code)
 
     def extend(self, code):
@@ -0,0 +1,71 @@
+// Coverage recorder.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+#include "mit/mit.h"
+
+#include "coverage.h"
+
+
+MIT_THREAD_LOCAL uint8_t *coverage_bits = NULL;
+MIT_THREAD_LOCAL mit_word_t *coverage_base = NULL;
+MIT_THREAD_LOCAL mit_uword_t coverage_words = 0;
+
+int mit_coverage_reset(mit_word_t *base, mit_uword_t words)
+{
+    uint8_t *bits = calloc((words + 7) / 8, 1);
+    if (bits == NULL && words != 0)
+        return -1;
+    free(coverage_bits);
+    coverage_bits = bits;
+    coverage_base = base;
+    coverage_words = bits == NULL ? 0 : words;
+    return 0;
+}
+
+const uint8_t *mit_coverage_bitmap(void)
+{
+    return coverage_bits;
+}
+
+int mit_coverage_dump(int fd)
+{
+    int dup_fd = dup(fd);
+    if (dup_fd == -1)
+        return -1;
+    FILE *fp = fdopen(dup_fd, "wb");
+    if (fp == NULL) {
+        close(dup_fd);
+        return -1;
+    }
+
+    // Write the header: magic string, then number of words as an 8-byte
+    // little-endian number.
+    int ret = -1;
+    if (fwrite(MIT_COVERAGE_MAGIC, 1, 8, fp) != 8)
+        goto err;
+    uint64_t words = coverage_words;
+    for (int i = 0; i < 8; i++)
+        if (putc((int)((words >> (i * 8)) & 0xff), fp) == EOF)
+            goto err;
+    size_t bytes = (coverage_words + 7) / 8;
+    if (bytes > 0 && fwrite(coverage_bits, 1, bytes, fp) != bytes)
+        goto err;
+    ret = 0;
+
+ err:
+    if (fclose(fp) != 0)
+        ret = -1;
+    return ret;
+}
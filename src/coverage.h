@@ -0,0 +1,21 @@
+// Coverage recorder internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_COVERAGE_H
+#define MIT_COVERAGE_H
+
+
+// The coverage bitmap, with one bit for each of the `coverage_words` words
+// from `coverage_base`. Bit `i % 8` of byte `i / 8` is set when the word at
+// `coverage_base + i` is fetched as an instruction word.
+extern MIT_THREAD_LOCAL uint8_t *coverage_bits;
+extern MIT_THREAD_LOCAL mit_word_t *coverage_base;
+extern MIT_THREAD_LOCAL mit_uword_t coverage_words;
+
+#endif
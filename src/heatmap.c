@@ -0,0 +1,105 @@
+// Memory heatmap.
+//
+// Memory is divided into regions of 2^shift bytes, such as cache lines or
+// pages, and each region has a counter for each kind of access: reads and
+// writes of 1, 2 and 4 bytes and of a word.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+#include "mit/mit.h"
+
+#include "heatmap.h"
+
+
+static MIT_THREAD_LOCAL uint64_t *counts = NULL;
+static MIT_THREAD_LOCAL mit_uword_t base = 0;
+static MIT_THREAD_LOCAL size_t regions = 0;
+static MIT_THREAD_LOCAL unsigned shift = 0;
+
+int mit_heatmap_reset(void *start, size_t bytes, unsigned region_shift)
+{
+    if (region_shift >= sizeof(size_t) * 8)
+        return -1;
+    size_t new_regions = bytes == 0 ? 0 : ((bytes - 1) >> region_shift) + 1;
+    // Add a region for accesses outside the others.
+    if (new_regions > SIZE_MAX / MIT_HEATMAP_COUNTERS - 1)
+        return -1;
+    uint64_t *new_counts = calloc((new_regions + 1) * MIT_HEATMAP_COUNTERS, sizeof(uint64_t));
+    if (new_counts == NULL)
+        return -1;
+    free(counts);
+    counts = new_counts;
+    base = (mit_uword_t)start;
+    regions = new_regions;
+    shift = region_shift;
+    return 0;
+}
+
+void heatmap_access(uint8_t opcode, mit_uword_t addr)
+{
+    if (counts == NULL)
+        return;
+    // Opcodes run `load`, `store`, `load1`, `store1`, … `store4`.
+    unsigned kind = (opcode - MIT_INSTRUCTIONS_LOAD) / 8;
+    unsigned write = kind % 2;
+    unsigned width = (kind / 2 + 3) % 4; // Order widths 1, 2, 4, word.
+    size_t region = (addr - base) >> shift;
+    if (addr < base || region >= regions)
+        region = regions;
+    counts[region * MIT_HEATMAP_COUNTERS + write * 4 + width]++;
+}
+
+const uint64_t *mit_heatmap_counts(size_t *regions_ptr)
+{
+    *regions_ptr = regions;
+    return counts;
+}
+
+int mit_heatmap_dump(int fd)
+{
+    int dup_fd = dup(fd);
+    if (dup_fd == -1)
+        return -1;
+    FILE *fp = fdopen(dup_fd, "w");
+    if (fp == NULL) {
+        close(dup_fd);
+        return -1;
+    }
+
+    int ret = -1;
+    if (fprintf(fp, "# regions %zu shift %u\n", regions, shift) < 0 ||
+        fprintf(fp, "# offset\treads_1\treads_2\treads_4\treads_word\twrites_1\twrites_2\twrites_4\twrites_word\n") < 0)
+        goto err;
+    for (size_t i = 0; i <= regions; i++) {
+        const uint64_t *c = &counts[i * MIT_HEATMAP_COUNTERS];
+        int used = 0;
+        for (unsigned j = 0; j < MIT_HEATMAP_COUNTERS; j++)
+            used |= c[j] != 0;
+        if (!used)
+            continue;
+        if ((i < regions ? fprintf(fp, "0x%zx", i << shift) : fprintf(fp, "outside")) < 0)
+            goto err;
+        for (unsigned j = 0; j < MIT_HEATMAP_COUNTERS; j++)
+            if (fprintf(fp, "\t%llu", (unsigned long long)c[j]) < 0)
+                goto err;
+        if (fprintf(fp, "\n") < 0)
+            goto err;
+    }
+    ret = 0;
+
+ err:
+    if (fclose(fp) != 0)
+        ret = -1;
+    return ret;
+}
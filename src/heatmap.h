@@ -0,0 +1,23 @@
+// Memory heatmap internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_HEATMAP_H
+#define MIT_HEATMAP_H
+
+
+// Returns non-zero if `opcode` is one of the `load` and `store`
+// instructions, all of which take the address from the top of the stack.
+#define HEATMAP_IS_ACCESS(opcode)                                       \
+    ((opcode) >= MIT_INSTRUCTIONS_LOAD && (opcode) <= MIT_INSTRUCTIONS_STORE4 && \
+     (opcode) % 8 == 0)
+
+// Record an access by `load` or `store` instruction `opcode` to `addr`.
+void heatmap_access(uint8_t opcode, mit_uword_t addr);
+
+#endif
@@ -0,0 +1,30 @@
+// Stack high-water mark.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include "mit/mit.h"
+
+#include "highwater.h"
+
+
+MIT_THREAD_LOCAL mit_uword_t highwater_depth = 0;
+MIT_THREAD_LOCAL mit_uword_t highwater_calls = 0;
+MIT_THREAD_LOCAL mit_uword_t highwater_max_calls = 0;
+
+void mit_highwater_reset(void)
+{
+    highwater_depth = highwater_calls = highwater_max_calls = 0;
+}
+
+void mit_highwater(mit_uword_t *depth_ptr, mit_uword_t *calls_ptr)
+{
+    *depth_ptr = highwater_depth;
+    *calls_ptr = highwater_max_calls;
+}
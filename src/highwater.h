@@ -0,0 +1,22 @@
+// Stack high-water mark internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_HIGHWATER_H
+#define MIT_HIGHWATER_H
+
+
+// The greatest stack depth seen in any frame.
+extern MIT_THREAD_LOCAL mit_uword_t highwater_depth;
+
+// The number of calls in progress made by `call` and `catch`, and the
+// greatest number seen.
+extern MIT_THREAD_LOCAL mit_uword_t highwater_calls;
+extern MIT_THREAD_LOCAL mit_uword_t highwater_max_calls;
+
+#endif
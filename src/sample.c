@@ -0,0 +1,142 @@
+// Sampling profiler.
+//
+// A `SIGPROF` interval timer interrupts the process periodically; the
+// signal handler records the instruction being executed by
+// `mit_run_sample` and the current call depth in a fixed-size buffer,
+// reserving a slot with an atomic increment, so it never allocates or
+// takes a lock.
+//
+// The timer is process-wide, and the signal may be delivered to any
+// thread, so `mit_run_sample` publishes its state in process-global
+// variables rather than thread-local ones, whose access from a shared
+// library may call `__tls_get_addr`, which is not async-signal-safe. Hence
+// only one thread at a time can be sampled.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include <errno.h>
+#include <signal.h>
+#include <stdatomic.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <sys/time.h>
+
+#include "mit/mit.h"
+
+#include "sample.h"
+
+
+mit_word_t * volatile sample_pc = NULL;
+volatile mit_uword_t sample_depth = 0;
+
+struct sample {
+    mit_word_t *pc;
+    mit_uword_t depth;
+};
+
+static struct sample *samples = NULL;
+static size_t samples_size = 0;
+// The number of samples taken; those beyond `samples_size` were dropped.
+static atomic_size_t samples_taken;
+static int sampling = 0;
+
+#ifdef SIGPROF
+static struct sigaction old_action;
+
+static void handler(int signum)
+{
+    (void)signum;
+    mit_word_t *pc = sample_pc;
+    if (pc == NULL) // Not running VM code.
+        return;
+    size_t i = atomic_fetch_add_explicit(&samples_taken, 1, memory_order_relaxed);
+    if (i < samples_size)
+        samples[i] = (struct sample){pc, sample_depth};
+}
+#endif
+
+int mit_sample_start(unsigned long interval, size_t max_samples)
+{
+#ifdef SIGPROF
+    if (sampling || interval == 0) {
+        errno = EINVAL;
+        return -1;
+    }
+    struct sample *new_samples = calloc(max_samples, sizeof(struct sample));
+    if (new_samples == NULL)
+        return -1;
+    free(samples);
+    samples = new_samples;
+    samples_size = max_samples;
+    atomic_store(&samples_taken, 0);
+
+    struct sigaction action = { .sa_handler = handler, .sa_flags = SA_RESTART };
+    sigemptyset(&action.sa_mask);
+    if (sigaction(SIGPROF, &action, &old_action) != 0)
+        return -1;
+    struct timeval tv = { .tv_sec = interval / 1000000, .tv_usec = interval % 1000000 };
+    struct itimerval timer = { .it_interval = tv, .it_value = tv };
+    if (setitimer(ITIMER_PROF, &timer, NULL) != 0) {
+        sigaction(SIGPROF, &old_action, NULL);
+        return -1;
+    }
+    sampling = 1;
+    return 0;
+#else
+    (void)interval;
+    (void)max_samples;
+    errno = ENOSYS;
+    return -1;
+#endif
+}
+
+int mit_sample_stop(void)
+{
+#ifdef SIGPROF
+    if (!sampling)
+        return 0;
+    struct itimerval timer = { { 0, 0 }, { 0, 0 } };
+    int ret = setitimer(ITIMER_PROF, &timer, NULL);
+    if (sigaction(SIGPROF, &old_action, NULL) != 0)
+        ret = -1;
+    sampling = 0;
+    return ret;
+#else
+    return 0;
+#endif
+}
+
+int mit_sample_dump(int fd)
+{
+    int dup_fd = dup(fd);
+    if (dup_fd == -1)
+        return -1;
+    FILE *fp = fdopen(dup_fd, "w");
+    if (fp == NULL) {
+        close(dup_fd);
+        return -1;
+    }
+
+    int ret = -1;
+    size_t taken = atomic_load(&samples_taken);
+    size_t kept = taken < samples_size ? taken : samples_size;
+    if (fprintf(fp, "# dropped %zu\n# addr\tdepth\n", taken - kept) < 0)
+        goto err;
+    for (size_t i = 0; i < kept; i++)
+        if (fprintf(fp, "0x%zx\t%zu\n", (size_t)samples[i].pc, (size_t)samples[i].depth) < 0)
+            goto err;
+    ret = 0;
+
+ err:
+    if (fclose(fp) != 0)
+        ret = -1;
+    return ret;
+}
@@ -0,0 +1,27 @@
+// Sampling profiler internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_SAMPLE_H
+#define MIT_SAMPLE_H
+
+
+// These variables are process-global, so that the signal handler can read
+// them whichever thread it interrupts. They are written with single
+// word-sized stores, which the handler cannot observe half-done.
+
+// The address of the instruction word being executed, or `NULL` outside
+// `mit_run_sample`; published by the instrumented interpreter before each
+// instruction, and read by the signal handler.
+extern mit_word_t * volatile sample_pc;
+
+// The number of calls in progress made by `call` and `catch` inside the
+// outermost `mit_run_sample`.
+extern volatile mit_uword_t sample_depth;
+
+#endif
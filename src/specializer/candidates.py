@@ -0,0 +1,186 @@
+'''
+Build and measure candidate specialized interpreters concurrently.
+
+Each Candidate is a separate build tree of Mit, configured like the main
+one, with its own copy of pForth to run as the workload, so that several
+interpreters can be built and measured at once. Measurements are pinned to
+a CPU each, to reduce interference between them.
+
+The build trees are configured outside the source tree, which is only
+possible if the main build is too; see `check_vpath()`.
+
+The following environment variables must be set: `abs_top_srcdir`,
+`abs_top_builddir` and `srcdir` (relative to `abs_top_builddir/src`, the
+current directory).
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import os
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import cost
+
+
+# The directory, relative to the build directory of `src`, containing the
+# candidate build trees.
+CANDIDATES_DIR = 'specializer/candidates'
+
+
+def check_vpath():
+    '''
+    Raise an error if the main build is in the source tree, which stops
+    the candidate build trees from being configured.
+    '''
+    if os.path.exists(os.path.join(os.environ['abs_top_srcdir'], 'config.status')):
+        raise ValueError(
+            'building candidates in parallel needs Mit to be configured '
+            'outside its source directory'
+        )
+
+
+class Candidate:
+    '''
+    A build tree in which to build and measure a specialized interpreter.
+
+    Public fields:
+     - index - int - the index of this Candidate, which is also the index
+       of the CPU it is measured on, modulo the number of CPUs available.
+     - builddir - str - the absolute path of the top build directory.
+    '''
+    def __init__(self, index):
+        self.index = index
+        self.builddir = os.path.abspath(os.path.join(CANDIDATES_DIR, str(index)))
+
+    def __repr__(self):
+        return f'Candidate({self.index})'
+
+    def src_dir(self):
+        return os.path.join(self.builddir, 'src')
+
+    def mit_binary(self):
+        return os.path.join(
+            self.src_dir(),
+            os.path.basename(os.environ['MIT_BINARY']),
+        )
+
+    def pforth_dir(self):
+        return os.path.join(self.builddir, 'pforth', 'src', 'mit')
+
+    def labels_file(self):
+        return os.path.join(self.src_dir(), 'specializer', 'labels.json')
+
+    def log_file(self):
+        return os.path.join(self.builddir, 'candidate.log')
+
+    def environment(self):
+        '''
+        Returns the environment in which to run this Candidate's programs.
+        '''
+        env = dict(os.environ)
+        objdir = os.path.join(self.src_dir(), os.getenv('objdir', '.libs'))
+        specializer_objdir = os.path.join(
+            self.src_dir(), 'specializer', os.getenv('objdir', '.libs'))
+        env['LD_LIBRARY_PATH'] = ':'.join(
+            [objdir, specializer_objdir, os.getenv('LD_LIBRARY_PATH', '')])
+        env['MIT_BINARY'] = self.mit_binary()
+        env['MIT_PROFILE_BINARY'] = os.path.join(
+            self.builddir, 'python', 'mit-profile')
+        return env
+
+    def _check_call(self, command, **kwargs):
+        # Log the output, which would otherwise be interleaved with that of
+        # other Candidates.
+        with open(self.log_file(), 'a') as log:
+            subprocess.check_call(
+                command, stdout=log, stderr=subprocess.STDOUT,
+                env=self.environment(), **kwargs,
+            )
+
+    def configure(self):
+        '''
+        Configure and build the tree, and copy pForth into it, if not
+        already done.
+        '''
+        if not os.path.exists(os.path.join(self.builddir, 'config.status')):
+            os.makedirs(self.builddir, exist_ok=True)
+            options = subprocess.check_output(
+                ['./config.status', '--config'],
+                cwd=os.environ['abs_top_builddir'],
+                universal_newlines=True,
+            ).strip()
+            self._check_call(
+                f'{os.environ["abs_top_srcdir"]}/configure {options}',
+                shell=True, cwd=self.builddir,
+            )
+            self._check_call(['make'], cwd=self.builddir)
+        pforth = os.path.join(self.builddir, 'pforth')
+        if not os.path.exists(pforth):
+            shutil.copytree(
+                os.path.join(os.environ['srcdir'], 'specializer', 'pforth'),
+                pforth,
+                symlinks=True,
+                ignore=shutil.ignore_patterns('.git'),
+            )
+
+    def build(self, profile_file, simulate_jit_options=''):
+        '''
+        Build the interpreter specialized for `profile_file`.
+
+         - profile_file - str - the profile to give to `simulate-jit`.
+         - simulate_jit_options - str - extra options for `simulate-jit`.
+        '''
+        self._check_call(
+            ['make',
+             f'SPECIALIZER_PROFILE={os.path.abspath(profile_file)}',
+             f'SIMULATE_JIT_OPTIONS={simulate_jit_options}'],
+            cwd=self.src_dir(),
+        )
+
+    def measure(self, backend, repeat):
+        '''
+        Measure the cost of the interpreter, pinned to this Candidate's CPU.
+        Must be run in a process of its own; see `map_candidates()`.
+        '''
+        cpus = sorted(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpus[self.index % len(cpus)]})
+        os.environ.update(self.environment())
+        return cost.measure(backend, self.mit_binary(), self.pforth_dir(), repeat)
+
+    def profile(self, profile_file):
+        '''
+        Profile the interpreter running the workload, writing the profile to
+        `profile_file`.
+        '''
+        self._check_call(
+            [os.path.join(self.builddir, 'python', 'mit-profile'),
+             os.path.abspath(profile_file), 'pforth', 'make.fs'],
+            cwd=self.pforth_dir(),
+        )
+
+
+def _call(method, candidate, args):
+    return getattr(candidate, method)(*args)
+
+def map_candidates(method, calls):
+    '''
+    Call a method on several Candidates concurrently, each in a process of
+    its own, and return a list of the results.
+
+     - method - str - the name of a Candidate method.
+     - calls - list of (Candidate, tuple) - the Candidates, and the
+       arguments to pass to the method for each.
+    '''
+    with ProcessPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [
+            executor.submit(_call, method, candidate, args)
+            for candidate, args in calls
+        ]
+        return [future.result() for future in futures]
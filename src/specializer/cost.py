@@ -0,0 +1,144 @@
+'''
+Measure the cost of running a Mit interpreter on a workload.
+
+The workload is pForth building itself. Several backends are available, so
+that the specializer can be tuned on machines where `operf` cannot be used:
+
+ - operf - the number of instructions retired by the CPU, as sampled by
+   `operf`. This needs oprofile, and permission to use the performance
+   counters.
+ - profile - an estimate from a profile of the workload, made with
+   `mit-profile`: the number of labels reached, each of which tests a
+   guess, plus `FALLBACK_COST` for each instruction executed by the
+   fallback interpreter.
+ - wall - the elapsed time measured with `clock_gettime(CLOCK_MONOTONIC)`,
+   in seconds.
+ - rusage - the user plus system CPU time reported by `getrusage()`, in
+   seconds.
+
+For the timing backends, the workload is run several times and the
+minimum is taken, which is the measurement least disturbed by other
+activity.
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import os
+import re
+import filecmp
+import resource
+import subprocess
+import tempfile
+import time
+
+import profile
+
+
+BACKENDS = ('operf', 'profile', 'wall', 'rusage')
+
+# The estimated cost of executing an instruction in the fallback
+# interpreter, relative to testing a guess.
+FALLBACK_COST = 10
+
+# The directory, relative to the build directory of `src`, in which pForth
+# builds itself.
+PFORTH_DIR = 'specializer/pforth/src/mit'
+
+
+def pforth_command(mit_binary):
+    '''
+    Returns the command that runs the workload, with any options given in
+    the environment variable `MIT_OPTIONS`.
+    '''
+    return [mit_binary] + os.getenv('MIT_OPTIONS', '').split() + ['pforth', 'make.fs']
+
+def _run_pforth(command, pforth_dir):
+    try:
+        os.remove(os.path.join(pforth_dir, 'pforth-new'))
+    except FileNotFoundError:
+        pass
+    subprocess.check_call(command, cwd=pforth_dir)
+
+def check_pforth(pforth_dir):
+    '''
+    Check that pForth built itself correctly.
+    '''
+    new = os.path.join(pforth_dir, 'pforth-new')
+    if not filecmp.cmp(os.path.join(pforth_dir, 'pforth'), new, shallow=False):
+        raise ValueError(f"'{new}' is not identical to 'pforth'")
+
+def parse_count(lines):
+    for i in range(len(lines)):
+        marker = '----'
+        if lines[i][:len(marker)] == marker:
+            return int(re.search(r'\d+', lines[i + 1])[0])
+
+
+def measure_operf(mit_binary, pforth_dir, repeat):
+    _run_pforth(
+        os.environ['TIME_BINARY'].split() + pforth_command(mit_binary),
+        pforth_dir,
+    )
+    check_pforth(pforth_dir)
+    output = subprocess.check_output(
+        ['libtool', '--mode=execute', 'opreport',
+         f'--session-dir={os.path.join(pforth_dir, "oprofile_data")}',
+         mit_binary],
+        universal_newlines=True,
+    )
+    return parse_count(output.splitlines())
+
+def measure_profile(mit_binary, pforth_dir, repeat):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        profile_file = os.path.join(tmpdir, 'profile.prof')
+        _run_pforth(
+            [os.environ['MIT_PROFILE_BINARY'], profile_file, 'pforth', 'make.fs'],
+            pforth_dir,
+        )
+        profile.load(profile_file)
+    check_pforth(pforth_dir)
+    total_count, fallback_count = profile.label_counts()
+    return total_count + FALLBACK_COST * fallback_count
+
+def _measure_time(mit_binary, pforth_dir, repeat, clock):
+    best = float('inf')
+    for _ in range(repeat):
+        start = clock()
+        _run_pforth(pforth_command(mit_binary), pforth_dir)
+        best = min(best, clock() - start)
+        check_pforth(pforth_dir)
+    return best
+
+def measure_wall(mit_binary, pforth_dir, repeat):
+    return _measure_time(
+        mit_binary, pforth_dir, repeat,
+        lambda: time.clock_gettime(time.CLOCK_MONOTONIC),
+    )
+
+def measure_rusage(mit_binary, pforth_dir, repeat):
+    def clock():
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+    return _measure_time(mit_binary, pforth_dir, repeat, clock)
+
+
+def measure(backend, mit_binary, pforth_dir=PFORTH_DIR, repeat=1):
+    '''
+    Measure the cost of running the workload. Lower is better.
+
+     - backend - str - one of BACKENDS.
+     - mit_binary - str - the Mit executable to measure.
+     - pforth_dir - str - the directory in which to run the workload.
+     - repeat - int - the number of runs for the timing backends.
+
+    The `operf` backend needs the environment variable `TIME_BINARY` to be
+    the `operf` command, and the `profile` backend needs
+    `MIT_PROFILE_BINARY` to be the `mit-profile` command.
+    '''
+    assert backend in BACKENDS
+    return globals()[f'measure_{backend}'](mit_binary, pforth_dir, repeat)
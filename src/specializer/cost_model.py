@@ -0,0 +1,400 @@
+'''
+An analytic model of the cost of a specialized interpreter.
+
+Rather than compiling and timing the interpreter that `gen-specializer`
+would generate from a labels file, we simulate its control flow on a
+stream of instructions, from a profile or a trace, and count the events
+that make it slow:
+
+ - guess tests - each label tests one guess.
+ - fallbacks - instructions executed by the fallback interpreter.
+ - cache moves - stack items moved by `CacheState.flush()` when jumping
+   between labels whose cached depths differ.
+
+The code size of the interpreter is also estimated, as the number of lines
+of C generated for the labels; a large interpreter is slowed by
+instruction cache misses.
+
+The estimated cost per instruction is a weighted sum of these.
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import json, random
+from collections import Counter
+from dataclasses import dataclass, field
+
+from specializer import CacheState, gen_case
+from specializer_spec import Instructions, INSTRUCTIONS, CALLING
+from path import Path
+from cost import FALLBACK_COST
+import profile, traces
+
+
+# The cost of each stack item moved when flushing the stack cache, relative
+# to testing a guess.
+MOVE_COST = 0.25
+
+# The cost added to each instruction per 1,000 lines of generated code.
+SIZE_COST = 0.01
+
+# The default number of instructions to simulate from a profile.
+PROFILE_INSTRUCTIONS = 1 << 20
+
+# The number of lines generated for each label in addition to the code
+# for its guess and jumps: comments, assertions, the test and braces.
+LABEL_OVERHEAD_LINES = 6
+
+# The number of lines generated for a typical label.
+TYPICAL_LABEL_LINES = 15
+
+# The estimated number of bytes of machine code per line of C generated for
+# the labels, and for the rest of the specialized interpreter, mostly the
+# fallback interpreter. Measured with GCC -O2 on x86-64.
+BYTES_PER_LINE = 2.25
+FIXED_BYTES = 16000
+
+
+def _lines(code):
+    return len(str(code).splitlines())
+
+def _cache_state(path):
+    state = path.state
+    return CacheState(state.cached_depth(), state.checked_depth())
+
+def _flush_moves(cache_state, path):
+    # `flush()` emits a line per item moved, then one to update
+    # `cached_depth`.
+    return max(0, _lines(cache_state.flush(_cache_state(path))) - 1)
+
+def code_bytes(code_lines):
+    '''
+    Returns the estimated size in bytes of the machine code of a
+    specialized interpreter whose labels have `code_lines` lines of C.
+    '''
+    return FIXED_BYTES + BYTES_PER_LINE * code_lines
+
+
+_guess_lines = {}
+
+def guess_lines(path, guess):
+    '''
+    Returns the estimated number of lines of C generated for a label at
+    `path` that guesses `guess`, up to the jump to the label for `path +
+    (guess,)`. Results are cached.
+
+     - path - Path.
+     - guess - Instructions.
+    '''
+    new_path = path.child(guess)
+    key = (
+        path.state.cached_depth(), path.state.checked_depth(),
+        new_path.state.cached_depth(), new_path.state.checked_depth(),
+        guess,
+    )
+    lines = _guess_lines.get(key)
+    if lines is None:
+        cache_state = _cache_state(path)
+        lines = LABEL_OVERHEAD_LINES + _lines(gen_case(guess, cache_state))
+        lines += _flush_moves(cache_state, new_path)
+        _guess_lines[key] = lines
+    return lines
+
+
+class LabelGraph:
+    '''
+    The control-flow graph of a specialized interpreter, as read from a
+    labels file written by `simulate-jit`.
+
+    Labels are represented by their index. The fallback label is
+    represented by `-1`; after executing an instruction it jumps to label
+    `0`.
+
+    Public fields:
+     - guesses - list of tuple of int - for each label, the Instruction
+       indices that must come next for the guess to be correct: the guess
+       followed by the preguess of `if_correct`.
+     - if_correct - list of int - for each label, the label to jump to if
+       the guess is correct.
+     - if_wrong - list of int - for each label, the label to jump to if the
+       guess is wrong.
+     - correct_moves - list of int - for each label, the number of cache
+       moves when the guess is correct.
+     - wrong_moves - list of int - for each label, the number of cache
+       moves when the guess is wrong.
+     - code_lines - int - the estimated number of lines of C for the
+       labels.
+    '''
+    def __init__(self, rows, no_preguess=False):
+        '''
+         - rows - list of dict - the contents of a labels file.
+         - no_preguess - bool - `True` to model `gen-specializer
+           --no-preguess`.
+        '''
+        paths = [
+            Path(tuple(Instructions[name] for name in row['path'].split()))
+            for row in rows
+        ]
+        def cache_state(index):
+            if index is None:
+                return CacheState(0, 0)
+            return _cache_state(paths[index])
+        def flush_moves(current, index):
+            return _flush_moves(current, Path(()) if index is None else paths[index])
+
+        self.guesses = []
+        self.if_correct = []
+        self.if_wrong = []
+        self.correct_moves = []
+        self.wrong_moves = []
+        self.code_lines = 0
+        for index, row in enumerate(rows):
+            guess = Instructions[row['guess']]
+            if_correct, if_wrong = row['if_correct'], row['if_wrong']
+            multiguess = (guess,)
+            if not no_preguess and if_correct is not None:
+                multiguess += tuple(
+                    Instructions[name]
+                    for name in rows[if_correct]['preguess'].split()
+                )
+            self.guesses.append(tuple(i.index for i in multiguess))
+            self.if_correct.append(-1 if if_correct is None else if_correct)
+            self.if_wrong.append(-1 if if_wrong is None else if_wrong)
+            # Model the code generated by `Label.generate_code()`.
+            c_state = cache_state(index)
+            case_lines = _lines(gen_case(guess, c_state))
+            self.correct_moves.append(flush_moves(c_state, if_correct))
+            self.wrong_moves.append(flush_moves(cache_state(index), if_wrong))
+            # Flushes before jumping to the fallback label are shared.
+            self.code_lines += (
+                LABEL_OVERHEAD_LINES + case_lines +
+                (0 if if_correct is None else self.correct_moves[-1]) +
+                (0 if if_wrong is None else self.wrong_moves[-1])
+            )
+
+    @classmethod
+    def load(cls, filename, no_preguess=False):
+        '''
+        Load a labels file written by `simulate-jit`.
+        '''
+        with open(filename) as h:
+            return cls(json.load(h), no_preguess)
+
+    def __len__(self):
+        return len(self.guesses)
+
+    def max_guess_length(self):
+        return max(len(guesses) for guesses in self.guesses)
+
+
+class CallStack:
+    '''
+    Models the calls of `run_inner()` made by `CALLING` Instructions, so
+    that a simulation continues after a call from the label reached by the
+    calling Instruction, as the specialized interpreter does when the call
+    returns. Each call starts at the root label.
+
+    Labels may be represented in any way.
+
+    Public fields:
+     - root - the root label.
+     - frames - list of `(label, catching)` - for each call in progress,
+       the label from which to continue when it returns, and whether it was
+       made by `CATCH`.
+    '''
+    # The Instruction indices that `step()` must be called for.
+    INDICES = frozenset(
+        instruction.index
+        for instruction in CALLING | {Instructions.RET, Instructions.THROW}
+    )
+
+    def __init__(self, root):
+        self.root = root
+        self.frames = []
+
+    def step(self, instruction, label):
+        '''
+        Returns the label from which to continue after executing
+        `instruction`, an Instruction index in `INDICES`, whose label is
+        `label`.
+        '''
+        instruction = INSTRUCTIONS[instruction]
+        if instruction in CALLING:
+            self.frames.append((label, instruction == Instructions.CATCH))
+            return self.root
+        while len(self.frames) > 0:
+            label, catching = self.frames.pop()
+            if instruction == Instructions.RET or catching:
+                return label
+        # Return from the outermost call.
+        return self.root
+
+
+@dataclass
+class Estimate:
+    '''
+    The counts of events from simulating a LabelGraph.
+     - instructions - int - the number of instructions executed.
+     - tests - int - the number of guesses tested.
+     - hits - int - the number of guesses that were correct.
+     - fallbacks - int - the number of instructions executed by the
+       fallback interpreter.
+     - moves - int - the number of stack items moved by cache flushes.
+     - code_lines - int - the estimated size of the interpreter.
+     - correct_counts - list of int - for each label, the number of times
+       its guess was correct.
+     - wrong_counts - list of int - for each label, the number of times
+       its guess was wrong.
+     - successor_counts - list of Counter - for each label, the number of
+       times it was reached before each Instruction index, if requested.
+    '''
+    instructions: int = 0
+    tests: int = 0
+    hits: int = 0
+    fallbacks: int = 0
+    moves: int = 0
+    code_lines: int = 0
+    correct_counts: list = field(default_factory=list)
+    wrong_counts: list = field(default_factory=list)
+    successor_counts: list = field(default_factory=list)
+
+    def hit_rate(self):
+        return self.hits / max(self.tests, 1)
+
+    def fallback_rate(self):
+        return self.fallbacks / max(self.instructions, 1)
+
+    def cost(
+        self,
+        fallback_cost=FALLBACK_COST,
+        move_cost=MOVE_COST,
+        size_cost=SIZE_COST,
+    ):
+        '''
+        Returns the estimated cost per instruction, in units of one guess
+        test.
+        '''
+        events = (
+            self.tests +
+            fallback_cost * self.fallbacks +
+            move_cost * self.moves
+        )
+        return (
+            events / max(self.instructions, 1) +
+            size_cost * self.code_lines / 1000
+        )
+
+    def report(self):
+        '''
+        Returns a multi-line str summarizing `self`.
+        '''
+        instructions = max(self.instructions, 1)
+        return '\n'.join([
+            f'instructions: {self.instructions}',
+            f'guess tests: {self.tests} ({self.tests / instructions:.3f} per instruction)',
+            f'guess hit rate: {self.hit_rate():.3f}',
+            f'fallbacks: {self.fallbacks} ({self.fallback_rate():.3f} per instruction)',
+            f'cache moves: {self.moves} ({self.moves / instructions:.3f} per instruction)',
+            f'code size: {self.code_lines} lines (about {code_bytes(self.code_lines) / 1024:.0f} KiB)',
+            f'estimated cost: {self.cost():.3f} per instruction',
+        ])
+
+
+def estimate(graph, trace_batches, max_instructions=None, count_successors=False):
+    '''
+    Simulate `graph` executing the instructions in `trace_batches`, and
+    return an Estimate.
+
+     - graph - LabelGraph.
+     - trace_batches - iterable of arrays of Instruction indices, as
+       generated by `traces.traces()` or `profile.random_traces()`.
+       `traces.FALLBACK` matches no guess.
+     - max_instructions - int - stop after this many instructions, or
+       `None` to run until `trace_batches` is exhausted (which must then be
+       finite).
+     - count_successors - bool - `True` to compute
+       `Estimate.successor_counts`.
+    '''
+    guesses, if_correct, if_wrong = graph.guesses, graph.if_correct, graph.if_wrong
+    correct_moves, wrong_moves = graph.correct_moves, graph.wrong_moves
+    lookahead = graph.max_guess_length() - 1
+    result = Estimate(code_lines=graph.code_lines)
+    correct_counts = [0] * len(graph)
+    wrong_counts = [0] * len(graph)
+    successor_counts = [Counter() for _ in range(len(graph))] if count_successors else None
+    fallbacks = moves = 0
+    label = 0
+    call_stack = CallStack(0)
+    call_indices = CallStack.INDICES
+    pending = []
+    executed = 0
+    finished = False
+    batches = iter(trace_batches)
+    while not finished:
+        # Keep `lookahead` instructions in hand to check preguesses,
+        # except at the end of the stream.
+        batch = next(batches, None)
+        if batch is None:
+            finished = True
+            end = len(pending)
+        else:
+            pending.extend(batch)
+            end = len(pending) - lookahead
+        if max_instructions is not None and executed + end >= max_instructions:
+            end = max_instructions - executed
+            finished = True
+        for pos in range(max(end, 0)):
+            instruction = pending[pos]
+            while True:
+                if label == -1:
+                    fallbacks += 1
+                    label = 0
+                    break
+                if successor_counts is not None:
+                    successor_counts[label][instruction] += 1
+                guess = guesses[label]
+                if guess[0] == instruction and (
+                    len(guess) == 1 or
+                    tuple(pending[pos:pos + len(guess)]) == guess
+                ):
+                    correct_counts[label] += 1
+                    moves += correct_moves[label]
+                    label = if_correct[label]
+                    break
+                wrong_counts[label] += 1
+                moves += wrong_moves[label]
+                label = if_wrong[label]
+            if instruction in call_indices:
+                label = call_stack.step(instruction, label)
+        executed += max(end, 0)
+        del pending[:max(end, 0)]
+    result.instructions = executed
+    result.correct_counts, result.wrong_counts = correct_counts, wrong_counts
+    if successor_counts is not None:
+        result.successor_counts = successor_counts
+    result.hits = sum(correct_counts)
+    result.tests = result.hits + sum(wrong_counts)
+    result.fallbacks, result.moves = fallbacks, moves
+    return result
+
+
+def instruction_stream(filename, batch_size=1 << 16, max_instructions=None):
+    '''
+    Returns a pair `(trace_batches, max_instructions)` suitable for passing
+    to `estimate()`, reading `filename`, which may be a trace or a profile.
+    A profile is sampled with a fixed seed, so that every LabelGraph sees
+    the same instructions, for `max_instructions` or
+    `PROFILE_INSTRUCTIONS`; a trace is read in full by default.
+    '''
+    if traces.is_trace(filename):
+        return traces.traces(filename, batch_size), max_instructions
+    profile.load(filename)
+    random.seed(0)
+    if max_instructions is None:
+        max_instructions = PROFILE_INSTRUCTIONS
+    return profile.random_traces(batch_size), max_instructions
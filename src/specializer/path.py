@@ -32,6 +32,9 @@ class State:
        smaller than `stack_max - stack_min`.
      - i_bits - int - the number of bits of `ir` executed since the last
        terminal instruction.
+
+    Nothing is known about the stack after an Instruction that flushes the
+    stack cache, so it sets `stack_pos` and `stack_max` to `stack_min`.
     '''
     stack_pos: int = 0
     stack_min: int = 0
@@ -65,6 +68,8 @@ class State:
         # Simulate pushing results.
         stack_pos += len(instruction.action.effect.results.items)
         stack_max = max(self.stack_max, stack_pos)
+        if instruction.action.flush:
+            stack_pos = stack_max = stack_min
         cd2 = stack_pos - stack_min
         # Simulate consuming `ir`.
         i_bits = self.i_bits + opcode_bit
@@ -84,18 +89,99 @@ class Path:
     '''
     Represents a sequence of Instructions.
 
-     - instructions - tuple of Instructions.
+    Paths are hash-consed: they form a trie in which each non-empty Path is
+    the child of the Path without its last Instruction, and there is only
+    one Path for each sequence of Instructions. Therefore Paths can be
+    compared by identity, extending a Path by one Instruction takes constant
+    time, and `state` is computed incrementally from `parent.state`.
+
+     - parent - Path - this Path without its last Instruction, or `None` if
+       this Path is empty.
+     - instruction - the last Instruction, or `None` if this Path is empty.
      - state - the State that exists at the end of this Path.
+     - instructions - tuple of Instructions.
     '''
-    def __init__(self, instructions):
+    __slots__ = (
+        'parent',
+        'instruction',
+        'state',
+        '_length',
+        '_children',
+        '_suffix',
+        '_first',
+        '_instructions',
+    )
+
+    # The empty Path, the root of the trie. Set below.
+    EMPTY = None
+
+    def __new__(cls, instructions):
         '''
-        Construct a Path for `instructions`.
+        Returns the Path for `instructions`, a tuple of Instructions.
         '''
         assert type(instructions) is tuple
-        self.instructions = instructions
-        self.state = State()
-        for instruction in instructions:
-            self.state = self.state.step(instruction)
+        return cls.EMPTY + instructions
+
+    @classmethod
+    def _make(cls, parent, instruction):
+        path = object.__new__(cls)
+        path.parent = parent
+        path.instruction = instruction
+        path._children = {}
+        path._instructions = None
+        if parent is None:
+            path.state = State()
+            path._length = 0
+            path._suffix = None
+            path._first = None
+        else:
+            path.state = parent.state.step(instruction)
+            path._length = parent._length + 1
+            # Computed lazily by `suffix()`.
+            path._suffix = None
+            path._first = instruction if parent._first is None else parent._first
+        return path
+
+    def child(self, instruction):
+        '''
+        Returns the Path `self + (instruction,)`.
+        '''
+        path = self._children.get(instruction.index)
+        if path is None:
+            path = Path._make(self, instruction)
+            self._children[instruction.index] = path
+        return path
+
+    def suffix(self):
+        '''
+        Returns the Path `self[1:]`. Requires `self` to be non-empty.
+        '''
+        assert self._length > 0
+        if self._suffix is None:
+            # Find the ancestors that lack a suffix, and compute theirs first,
+            # without recursion.
+            ancestors = []
+            path = self
+            while path._suffix is None and path._length > 1:
+                ancestors.append(path)
+                path = path.parent
+            if path._length == 1:
+                path._suffix = Path.EMPTY
+            for path in reversed(ancestors):
+                path._suffix = path.parent._suffix.child(path.instruction)
+        return self._suffix
+
+    @property
+    def instructions(self):
+        if self._instructions is None:
+            instructions = []
+            path = self
+            while path.parent is not None:
+                instructions.append(path.instruction)
+                path = path.parent
+            instructions.reverse()
+            self._instructions = tuple(instructions)
+        return self._instructions
 
     def _opcodes(self):
         return [i.opcode for i in self.instructions]
@@ -108,38 +194,67 @@ class Path:
     def __le__(self, other):
         return self._opcodes().__le__(other._opcodes())
 
-    def __eq__(self, other):
-        return self.instructions == other.instructions
-
-    def __hash__(self):
-        return hash(self.instructions)
+    # Paths are unique, so the default `__eq__` and `__hash__`, which use
+    # identity, are correct.
 
     def __len__(self):
-        return len(self.instructions)
+        return self._length
+
+    def __iter__(self):
+        return iter(self.instructions)
+
+    def __reversed__(self):
+        return reversed(self.instructions)
 
     def __getitem__(self, index_or_slice):
         if isinstance(index_or_slice, slice):
+            start, stop, step = index_or_slice.indices(self._length)
+            if start == 0 and step == 1:
+                return self.ancestor(max(stop, 0))
             return Path(self.instructions[index_or_slice])
         elif isinstance(index_or_slice, int):
+            if index_or_slice == -1 and self._length > 0:
+                return self.instruction
             return self.instructions[index_or_slice]
         else:
             raise TypeError('Path indices must be integers or slices')
 
     def __add__(self, sequence):
-        return Path(self.instructions + sequence)
+        path = self
+        for instruction in sequence:
+            path = path.child(instruction)
+        return path
+
+    def ancestor(self, length):
+        '''
+        Returns the prefix of `self` of length `length`.
+        '''
+        assert 0 <= length
+        path = self
+        while path._length > length:
+            path = path.parent
+        return path
+
+    def _drop(self, count):
+        '''
+        Returns `self[count:]`.
+        '''
+        path = self
+        for _ in range(count):
+            path = path.suffix()
+        return path
 
     def is_suffix_of(self, other):
         '''Tests whether `self` is a suffix of `other`.'''
         pos = len(other) - len(self)
-        return other.instructions[pos:] == self.instructions
+        return pos >= 0 and other._drop(pos) is self
 
     def is_proper_suffix_of(self, other):
         return len(self) < len(other) and self.is_suffix_of(other)
 
     def is_prefix_of(self, other):
         '''Tests whether `self` is a prefix of `other`.'''
-        pos = len(self)
-        return other.instructions[:pos] == self.instructions
+        return len(self) <= len(other) and other.ancestor(len(self)) is self
 
     def is_proper_prefix_of(self, other):
         return len(self) < len(other) and self.is_prefix_of(other)
@@ -149,6 +264,11 @@ class Path:
         Returns the last instruction of `other` that is not in `self`.
         Requires that `self` is a proper suffix of `other`.
         '''
-        assert self.is_proper_suffix_of(other)
         pos = len(other) - len(self)
-        return other[pos - 1]
+        assert pos > 0
+        path = other._drop(pos - 1)
+        assert path.suffix() is self
+        return path._first
+
+
+Path.EMPTY = Path._make(None, None)
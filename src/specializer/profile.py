@@ -9,10 +9,11 @@ THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
 RISK.
 '''
 
-import json, random
+import sys, json, random
+from array import array
 from dataclasses import dataclass
 
-from specializer_spec import Instructions
+from specializer_spec import Instructions, INSTRUCTIONS, UNCOMMON
 from path import Path
 
 
@@ -43,28 +44,333 @@ class Label:
         self.total_count = self.correct_count + self.wrong_count
 
 
+# A profile file is either binary, as written by `mit_profile_dump_binary()`
+# (see `mit.h`), or JSON. A JSON profile is either a list of objects, one
+# per label, or an object `{"mixture": [{"weight": float, "labels": list}]}`,
+# representing a weighted blend of profiles of different interpreters, e.g.
+# from `merge-profiles`. Within a mixture, each component's weight is the
+# share of the instructions it represents. Profiles written by `mit` also
+# give `correct_moves` and `wrong_moves`, the number of stack items moved
+# by cache flushes on each jump, which are kept but not used here. Profiles
+# written by other tools may lack them; in binary, a missing value is
+# written as -1.
+
+# The start of a binary profile file.
+MAGIC = b'MitPrf2\n'
+
+def is_binary(filename):
+    '''
+    Returns `True` if `filename` is a binary profile.
+    '''
+    with open(filename, 'rb') as h:
+        return h.read(len(MAGIC)) == MAGIC
+
+def _read_binary(filename):
+    '''
+    Read a binary profile file. Returns `(paths, guesses, successors, moves,
+    counts)`; see `read_numpy()`. `successors`, `moves` and `counts` are
+    flat arrays of signed, signed and unsigned ints respectively, with an
+    interleaved pair of elements per label: elements `2 * i` and `2 * i + 1`
+    are Label `i`'s `if_correct` and `if_wrong`, `correct_moves` and
+    `wrong_moves`, or `correct_count` and `wrong_count`.
+    '''
+    with open(filename, 'rb') as h:
+        data = h.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"'{filename}' is not a binary profile")
+    labels = int.from_bytes(data[8:16], 'little')
+    moves_start = 16 + 8 * labels
+    strings_start = moves_start + 8 * labels
+    counts_start = len(data) - 16 * labels
+    successors = array('i')
+    successors.frombytes(data[16:moves_start])
+    moves = array('i')
+    moves.frombytes(data[moves_start:strings_start])
+    counts = array('Q')
+    counts.frombytes(data[counts_start:])
+    if sys.byteorder == 'big':
+        successors.byteswap()
+        moves.byteswap()
+        counts.byteswap()
+    strings = data[strings_start:counts_start].split(b'\0')
+    paths = [s.decode() for s in strings[0:2 * labels:2]]
+    guesses = [s.decode() for s in strings[1:2 * labels:2]]
+    return paths, guesses, successors, moves, counts
+
+def read_numpy(filename):
+    '''
+    Read a binary profile file using NumPy, without constructing Labels, for
+    fast analysis. Returns `(paths, guesses, successors, moves, counts)`:
+
+     - paths - list of str - the path of each label.
+     - guesses - list of str - the guess of each label.
+     - successors - NumPy array of int32 of shape `(labels, 2)` - for each
+       label, `if_correct` and `if_wrong`.
+     - moves - NumPy array of int32 of shape `(labels, 2)` - for each
+       label, `correct_moves` and `wrong_moves`, or -1 if not known.
+     - counts - NumPy array of uint64 of shape `(labels, 2)` - for each
+       label, `correct_count` and `wrong_count`.
+    '''
+    import numpy
+    with open(filename, 'rb') as h:
+        data = h.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"'{filename}' is not a binary profile")
+    labels = int(numpy.frombuffer(data, dtype='<u8', count=1, offset=8)[0])
+    moves_start = 16 + 8 * labels
+    strings_start = moves_start + 8 * labels
+    counts_start = len(data) - 16 * labels
+    successors = numpy.frombuffer(
+        data, dtype='<i4', count=2 * labels, offset=16).reshape(labels, 2)
+    moves = numpy.frombuffer(
+        data, dtype='<i4', count=2 * labels, offset=moves_start).reshape(labels, 2)
+    counts = numpy.frombuffer(
+        data, dtype='<u8', count=2 * labels, offset=counts_start).reshape(labels, 2)
+    strings = data[strings_start:counts_start].split(b'\0')
+    paths = [s.decode() for s in strings[0:2 * labels:2]]
+    guesses = [s.decode() for s in strings[1:2 * labels:2]]
+    return paths, guesses, successors, moves, counts
+
+def _write_binary(filename, rows):
+    successors = array('i')
+    moves = array('i')
+    counts = array('Q')
+    strings = bytearray()
+    for row in rows:
+        successors.extend((row['if_correct'], row['if_wrong']))
+        moves.extend((row.get('correct_moves', -1), row.get('wrong_moves', -1)))
+        counts.extend((row['correct_count'], row['wrong_count']))
+        strings += row['path'].encode() + b'\0' + row['guess'].encode() + b'\0'
+    strings += bytes(-len(strings) % 8)
+    if sys.byteorder == 'big':
+        successors.byteswap()
+        moves.byteswap()
+        counts.byteswap()
+    with open(filename, 'wb') as h:
+        h.write(MAGIC)
+        h.write(len(rows).to_bytes(8, 'little'))
+        h.write(successors.tobytes())
+        h.write(moves.tobytes())
+        h.write(strings)
+        h.write(counts.tobytes())
+
+def read(filename):
+    '''
+    Read a profile data file. Returns a list of pairs `(weight, rows)`,
+    where `rows` is a list of dicts, one per label, with the keys of the
+    JSON format.
+    '''
+    if is_binary(filename):
+        paths, guesses, successors, moves, counts = _read_binary(filename)
+        rows = []
+        for i, (path, guess) in enumerate(zip(paths, guesses)):
+            row = {
+                'path': path,
+                'guess': guess,
+                'if_correct': successors[2 * i],
+                'if_wrong': successors[2 * i + 1],
+                'correct_count': counts[2 * i],
+                'wrong_count': counts[2 * i + 1],
+            }
+            if moves[2 * i] != -1:
+                row['correct_moves'] = moves[2 * i]
+                row['wrong_moves'] = moves[2 * i + 1]
+            rows.append(row)
+        return [(1.0, rows)]
+    with open(filename) as h:
+        obj = json.load(h)
+    if isinstance(obj, dict):
+        return [(c['weight'], c['labels']) for c in obj['mixture']]
+    return [(1.0, obj)]
+
+def write(filename, components, binary=False):
+    '''
+    Write a profile data file. If there is a single component, its weight
+    is discarded and a plain profile is written.
+
+     - components - list of `(weight, rows)`, as returned by `read()`.
+     - binary - bool - `True` to write a single component in binary.
+       Mixtures are always written as JSON.
+    '''
+    if len(components) == 1 and binary:
+        _write_binary(filename, components[0][1])
+        return
+    with open(filename, 'w') as h:
+        if len(components) == 1:
+            json.dump(components[0][1], h, indent=2)
+        else:
+            json.dump({'mixture': [
+                {'weight': weight, 'labels': rows}
+                for weight, rows in components
+            ]}, h, indent=2)
+
+def _total_count(rows):
+    return sum(row['correct_count'] + row['wrong_count'] for row in rows)
+
+def _round_count(count):
+    '''
+    Rounds a scaled count, keeping non-zero counts non-zero, so that a Label
+    that was reached is still reached.
+    '''
+    return max(1, round(count)) if count > 0 else 0
+
+def _scale_counts(rows, factor):
+    '''
+    Returns a copy of `rows` with the counts multiplied by `factor` and
+    rounded with `_round_count()`.
+    '''
+    return [
+        dict(
+            row,
+            correct_count=_round_count(row['correct_count'] * factor),
+            wrong_count=_round_count(row['wrong_count'] * factor),
+        )
+        for row in rows
+    ]
+
+# Components of a merged profile whose weight is less than this fraction of
+# the largest are dropped.
+MIN_WEIGHT = 1e-3
+
+def merge(components):
+    '''
+    Merge weighted profiles. Profiles of the same interpreter (i.e. with the
+    same labels) are combined exactly, by adding their counts, each scaled
+    by its weight divided by its total count; others are kept as components
+    of a mixture. Empty profiles and those with negligible weight are
+    dropped. Returns a list of `(weight, rows)`.
+
+     - components - list of `(weight, rows)`.
+    '''
+    max_weight = max((weight for weight, _ in components), default=0)
+    groups = {} # Map from labels to list of `(weight, rows)`.
+    for weight, rows in components:
+        if _total_count(rows) > 0 and weight > 0 and weight >= MIN_WEIGHT * max_weight:
+            key = tuple(
+                (row['path'], row['guess'], row['if_correct'], row['if_wrong'])
+                for row in rows
+            )
+            groups.setdefault(key, []).append((weight, rows))
+    merged = []
+    for group in groups.values():
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        scale = max(_total_count(rows) for _, rows in group)
+        total_weight = sum(weight for weight, _ in group)
+        counts = [[0.0, 0.0] for _ in group[0][1]]
+        for weight, rows in group:
+            factor = scale * weight / (total_weight * _total_count(rows))
+            for count, row in zip(counts, rows):
+                count[0] += factor * row['correct_count']
+                count[1] += factor * row['wrong_count']
+        merged.append((total_weight, [
+            dict(row, correct_count=_round_count(correct), wrong_count=_round_count(wrong))
+            for row, (correct, wrong) in zip(group[0][1], counts)
+        ]))
+    if len(merged) == 0 and len(components) > 0:
+        merged.append((1.0, []))
+    return merged
+
+
 def load(filename):
     '''
     Load a profile data file, and initialize `profile` and `ROOT_LABEL`.
     '''
-    global profile, ROOT_LABEL
-    with open(filename) as h:
-        profile = [
+    install(read(filename))
+
+def parse_workload(spec):
+    '''
+    Parse a command-line argument of the form `FILENAME[:WEIGHT]`. Returns
+    a pair `(filename, weight)`; the default weight is 1.
+    '''
+    filename, _, weight = spec.rpartition(':')
+    try:
+        return filename, float(weight)
+    except ValueError:
+        return spec, 1.0
+
+def read_merged(workloads, previous=None, decay=1.0):
+    '''
+    Read and merge several profile data files. Returns a list of `(weight,
+    rows)`; see `merge()`.
+
+     - workloads - list of `(filename, weight)` - profiles of the current
+       iteration of specialization.
+     - previous - str - if not `None`, a profile from the previous
+       iteration, e.g. the output of the last merge, to blend in.
+     - decay - float - the total weight of `previous` as a fraction of that
+       of `workloads`. As `previous` may itself be a blend of older
+       profiles, their weights decay exponentially.
+    '''
+    components = []
+    for filename, weight in workloads:
+        components.extend(
+            (weight * component_weight, rows)
+            for component_weight, rows in read(filename)
+        )
+    if previous is not None:
+        previous_components = read(previous)
+        previous_weight = sum(weight for weight, _ in previous_components)
+        if previous_weight > 0:
+            factor = decay * sum(weight for _, weight in workloads) / previous_weight
+            components.extend(
+                (factor * weight, rows)
+                for weight, rows in previous_components
+            )
+    return merge(components)
+
+def load_merged(workloads, previous=None, decay=1.0):
+    '''
+    Load and merge several profile data files, and initialize `profile` and
+    `ROOT_LABEL`. The arguments are as for `read_merged()`.
+    '''
+    install(read_merged(workloads, previous, decay))
+
+def install(components):
+    '''
+    Initialize `profile`, `ROOT_LABEL` and `ROOTS` from a list of `(weight,
+    rows)`, as returned by `read()` or `merge()`.
+
+    The Labels of all the components are concatenated in `profile`, and
+    their counts are scaled in proportion to the components' weights.
+    `ROOTS` gives the root Label of each component, and `WEIGHTS` its
+    weight.
+    '''
+    global profile, ROOT_LABEL, ROOTS, WEIGHTS
+    components = [(weight, rows) for weight, rows in components if len(rows) > 0]
+    if len(components) > 1:
+        total = sum(_total_count(rows) for _, rows in components)
+        total_weight = sum(weight for weight, _ in components)
+        components = [
+            (weight, _scale_counts(rows, total * weight / (total_weight * _total_count(rows))))
+            for weight, rows in components
+        ]
+    profile = []
+    ROOTS = []
+    WEIGHTS = []
+    for weight, rows in components:
+        offset = len(profile)
+        def relocate(index):
+            return -1 if index == -1 else index + offset
+        profile.extend(
             Label(
-                index,
+                offset + index,
                 Path(tuple(
                     Instructions[name]
-                    for name in profile['path'].split()
+                    for name in row['path'].split()
                 )),
-                Instructions[profile['guess']],
-                profile['if_correct'],
-                profile['if_wrong'],
-                profile['correct_count'],
-                profile['wrong_count'],
+                Instructions[row['guess']],
+                relocate(row['if_correct']),
+                relocate(row['if_wrong']),
+                row['correct_count'],
+                row['wrong_count'],
             )
-            for index, profile in enumerate(json.load(h))
-        ]
-    ROOT_LABEL = get_label(0) if len(profile) > 0 else None
+            for index, row in enumerate(rows)
+        )
+        ROOTS.append(profile[offset])
+        WEIGHTS.append(weight)
+    ROOT_LABEL = ROOTS[0] if len(ROOTS) > 0 else None
 
 
 def get_label(index):
@@ -74,20 +380,67 @@ def get_label(index):
         return profile[index]
 
 
-def random_trace():
-    label = ROOT_LABEL
+def _random_traces(root, length):
+    '''
+    Like `random_traces()`, but simulates only the interpreter whose root
+    Label is `root`.
+    '''
+    randrange = random.randrange
+    # Instructions for uncommon operand values are rarely executed.
+    common = [
+        instruction.index
+        for instruction in INSTRUCTIONS
+        if instruction not in UNCOMMON
+    ]
+    num_instructions = len(common)
+    label = root
     while True:
-        if label is None:
-            # Fallback interpreter is modelled as uniformly random.
-            yield random.choice(list(Instructions))
-            label = ROOT_LABEL
-        elif random.randrange(label.total_count) < label.correct_count:
-            # Model a correct guess.
-            yield label.guess
-            label = get_label(label.if_correct)
-        else:
-            # Model a wrong guess.
-            label = get_label(label.if_wrong)
+        trace = array('H')
+        append = trace.append
+        while len(trace) < length:
+            if label is None:
+                # Fallback interpreter is modelled as uniformly random.
+                append(common[randrange(num_instructions)])
+                label = root
+            elif (
+                label.total_count > 0 and
+                randrange(label.total_count) < label.correct_count
+            ):
+                # Model a correct guess.
+                append(label.guess.index)
+                label = get_label(label.if_correct)
+            else:
+                # Model a wrong guess. A Label with no counts always
+                # guesses wrong.
+                label = get_label(label.if_wrong)
+        yield trace
+
+# The number of consecutive instructions to take from one component of a
+# mixture.
+SEGMENT_LENGTH = 1024
+
+def random_traces(length):
+    '''
+    Generates an endless sequence of traces, each an array of `length`
+    Instruction indices (see `specializer_spec.INSTRUCTIONS`), by simulating
+    the profiled interpreter as a Markov chain. Consecutive traces continue
+    from one another.
+
+    For a mixture, segments of `SEGMENT_LENGTH` instructions are taken from
+    the components at random in proportion to their weights, each
+    continuing from the previous segment of the same component.
+    '''
+    if len(ROOTS) <= 1:
+        yield from _random_traces(ROOT_LABEL, length)
+        return
+    segments = [_random_traces(root, SEGMENT_LENGTH) for root in ROOTS]
+    components = range(len(segments))
+    trace = array('H')
+    while True:
+        while len(trace) < length:
+            trace.extend(next(segments[random.choices(components, WEIGHTS)[0]]))
+        yield trace[:length]
+        trace = trace[length:]
 
 
 # Analysis functions.
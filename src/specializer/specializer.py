@@ -161,6 +161,11 @@ def gen_case(instruction, cache_state):
        Updated in place.
     '''
     code = Code()
+    if instruction.action.flush:
+        # The code manages the stack itself.
+        code.extend(cache_state.flush(CacheState(0, 0)))
+        code.extend(instruction.action.code)
+        return code
     num_args = len(instruction.action.effect.args.items)
     num_results = len(instruction.action.effect.results.items)
     # Declare C variables for args and results.
@@ -11,11 +11,17 @@ RISK.
 
 from dataclasses import dataclass
 
-from code_util import Code
+from code_util import Code, c_symbol
 from action import Action, ActionEnum
 from spec import Instructions, ExtraInstructions
+import stack
 from stack import StackEffect, Size
 
+# Only the names and codes of the trap functions are needed here, not the
+# sizes of their types.
+stack.TYPE_SIZE_UNKNOWN = 0
+from traps import LibInstructions
+
 
 @dataclass
 class Instruction(Action):
@@ -25,6 +31,18 @@ class Instruction(Action):
      - guard - str - C expression which must evaluate to true for the
        specialized instruction to be executed. The guard may assume that the
        stack contains enough items to read `effect.args`.
+     - terminal - bool - `True` if the instruction consumes the rest of `ir`.
+       Unless `immediate` or `ir_value` says otherwise, the rest of `ir`
+       must be all copies of the top bit of the opcode.
+     - immediate - bool - `True` if the rest of `ir` must not be all copies
+       of the top bit of the opcode, but is an immediate operand.
+     - ir_value - int - if not `None`, the value that the rest of `ir` must
+       have, e.g. the opcode of an extra instruction.
+     - flush - bool - `True` if the stack cache must be flushed before
+       running `code`, which manages the stack itself, e.g. because it
+       calls another function. `effect.args` are left on the stack, and
+       `effect.results` must be empty. Nothing is known about the stack
+       afterwards.
      
     Specialized instructions have only one control flow path. Instructions with
     more than one control flow path are modelled as several specialized
@@ -35,11 +53,16 @@ class Instruction(Action):
     '''
     guard: str
     terminal: bool=False
+    immediate: bool=False
+    ir_value: int=None
+    flush: bool=False
 
     def __post_init__(self):
         super().__post_init__()
         assert not self.is_variadic
+        assert self.terminal or not (self.immediate or self.ir_value is not None)
         if self.effect is not None:
+            assert not (self.flush and len(self.effect.results.items) > 0)
             assert all(
                 item.size == Size(1)
                 for item in self.effect.by_name.values()
@@ -72,8 +95,23 @@ def _gen_ordinary_instruction(instruction, guard='1'):
         instruction.opcode,
     )
 
+def _gen_manual_instruction(action, opcode, guard='1', **kwargs):
+    '''
+    Returns a specialized Instruction for an Action that may manage the
+    stack itself, like `call`. Such an Action has a `None` effect, and
+    needs the stack cache to be flushed.
+    '''
+    effect = action.effect
+    flush = effect is None
+    if flush:
+        effect = StackEffect.of([], [])
+    return (
+        Instruction(effect, action.code, guard, flush=flush, **kwargs),
+        opcode,
+    )
+
 def _gen_variadic_instruction(instruction, count):
-    replacement = [f'x{i}' for i in range(count)]
+    replacement = [f'item{i}' for i in range(count)]
     code = Code()
     code.append(f'''\
         (void)COUNT; // Avoid a warning with -DNDEBUG
@@ -82,7 +120,7 @@ def _gen_variadic_instruction(instruction, count):
     if count > 0:
         code.append('// Suppress warnings about possibly unused variables.')
         for i in range(count):
-            code.append(f'(void)x{i};')
+            code.append(f'(void)item{i};')
     code.extend(instruction.action.action.code)
     return (
         Instruction(
@@ -97,25 +135,172 @@ def _gen_variadic_instruction(instruction, count):
         instruction.opcode,
     )
 
+def _gen_push_instruction(instruction, literal, literals=()):
+    if literal is None:
+        # Exclude the literals that have their own specialized instructions.
+        return _gen_manual_instruction(
+            instruction.action.action,
+            instruction.opcode,
+            ' && '.join(f'*pc != {literal}' for literal in literals) or '1',
+        )
+    return _gen_manual_instruction(
+        Action(
+            instruction.action.action.effect,
+            Code(f'val = {literal};', 'pc++;'),
+        ),
+        instruction.opcode,
+        f'*pc == {literal}',
+    )
+
+def _gen_jumpz_instruction(instruction, taken, immediate):
+    action = instruction.action.terminal if immediate else instruction.action.action
+    effect = action.effect
+    code = Code()
+    code.append('// Suppress warnings about possibly unused variables.')
+    for name in effect.by_name:
+        code.append(f'(void){name};')
+    if taken:
+        code.append('DO_JUMPI;' if immediate else 'DO_JUMP(addr);')
+    return (
+        Instruction(
+            effect,
+            code,
+            # `flag` is on top of the stack if the jump is immediate.
+            f'{{stack_{0 if immediate else 1}}} {"==" if taken else "!="} 0',
+            True,
+            immediate=immediate,
+        ),
+        instruction.opcode,
+    )
+
+def _gen_extra_instruction(extra):
+    code = Code('ir = 0;')
+    code.extend(extra.action.code)
+    return _gen_manual_instruction(
+        Action(extra.action.effect, code),
+        Instructions.NEXT.opcode,
+        terminal=True,
+        ir_value=extra.opcode,
+    )
+
+def _gen_trap_instruction(library, function):
+    function_code = f'{c_symbol(library.library.__name__)}_{function.name}'
+    return (
+        Instruction(
+            StackEffect.of(['function'], []),
+            Code(f'''\
+                {{
+                    // Pop the function code, which the guard has checked.
+                    mit_uword_t trap_stack_depth = stack_depth - 1;
+                    mit_word_t inner_error = trap_{library.name.lower()}({function_code}, stack, &trap_stack_depth);
+                    if (inner_error != MIT_ERROR_OK)
+                        THROW(inner_error);
+                    stack_depth = trap_stack_depth;
+                }}
+            '''),
+            f'{{stack_0}} == {function_code}',
+            True,
+            ir_value=library.opcode,
+            flush=True,
+        ),
+        Instructions.NEXTFF.opcode,
+    )
+
+# The counts for which variadic instructions are always specialized.
+COMMON_COUNTS = range(4)
+
+# The operand values for which instructions are also specialized, as a dict
+# from the name of a VM instruction (`PUSH`, or a variadic instruction) to a
+# list of literals or counts. They are found from a trace by
+# `find-operand-values`, which writes `operand_values.py`; see
+# `specializer.am`. Without it, there are none.
+try:
+    from operand_values import operand_values
+except ImportError:
+    operand_values = {}
+
 specialized_instructions = {}
+uncommon_names = set()
 for instruction in Instructions:
-    if instruction.action.action.is_variadic:
-        for count in range(4):
-            specialized_instructions[f'{instruction.name}_WITH_{count}'] = \
-                _gen_variadic_instruction(instruction, count)
-    elif instruction.action.action.effect is not None:
+    if instruction == Instructions.PUSH:
+        # Push the literal as a C constant, so that the C compiler can fold
+        # it into later instructions.
+        literals = operand_values.get(instruction.name, [])
         specialized_instructions[instruction.name] = \
-            _gen_ordinary_instruction(instruction)
+            _gen_push_instruction(instruction, None, literals)
+        for literal in literals:
+            name = f'PUSH_CONST_{literal}'
+            specialized_instructions[name] = \
+                _gen_push_instruction(instruction, literal)
+            uncommon_names.add(name)
+    elif instruction == Instructions.JUMPZ:
+        # Specialize the direction of the branch, so that labels can follow
+        # each one separately.
+        for immediate in (False, True):
+            for taken in (True, False):
+                name = f'JUMPZ{"I" if immediate else ""}_{"TAKEN" if taken else "NOT_TAKEN"}'
+                specialized_instructions[name] = \
+                    _gen_jumpz_instruction(instruction, taken, immediate)
+    elif instruction.action.action.is_variadic:
+        counts = sorted(
+            set(COMMON_COUNTS) | set(operand_values.get(instruction.name, []))
+        )
+        for count in counts:
+            name = f'{instruction.name}_WITH_{count}'
+            specialized_instructions[name] = \
+                _gen_variadic_instruction(instruction, count)
+            if count not in COMMON_COUNTS:
+                uncommon_names.add(name)
+    else:
+        specialized_instructions[instruction.name] = _gen_manual_instruction(
+            instruction.action.action,
+            instruction.opcode,
+            terminal=instruction.action.terminal is not None,
+        )
+        if instruction in (Instructions.JUMP, Instructions.CALL):
+            specialized_instructions[f'{instruction.name}I'] = _gen_manual_instruction(
+                instruction.action.terminal,
+                instruction.opcode,
+                terminal=True,
+                immediate=True,
+            )
+
+# Extra instructions. Those whose opcodes do not fit in the operand byte of
+# a trace record, `ARGC` and `ARGV`, are rarely executed.
+for extra in ExtraInstructions:
+    if extra.opcode < 0xff:
+        specialized_instructions[extra.name] = _gen_extra_instruction(extra)
+
+# Traps, one for each function, so that hot traps are dispatched directly.
+for library in LibInstructions:
+    for function in library.library:
+        specialized_instructions[f'TRAP_{library.name}_{function.name}'] = \
+            _gen_trap_instruction(library, function)
 
 Instructions = ActionEnum(
     'Instructions',
     specialized_instructions,
 )
 
-# The set of Instructions that might modify the `ir` register.
-# We cannot guess beyond such an instruction.
-GUESS_LIMITING = frozenset([
-    Instructions.NEXT,
-    Instructions.JUMP,
-    Instructions.JUMPZ,
-])
+# Instructions in a fixed order, so that each can be represented compactly by
+# its `index` in this tuple.
+INSTRUCTIONS = tuple(Instructions)
+for index, instruction in enumerate(INSTRUCTIONS):
+    instruction.index = index
+
+# The Instructions specialized for uncommon operand values.
+UNCOMMON = frozenset(Instructions[name] for name in uncommon_names)
+
+# The set of Instructions that might modify the `ir` register, or return
+# from `run_inner()`. We cannot guess beyond such an instruction.
+GUESS_LIMITING = frozenset(
+    instruction
+    for instruction in Instructions
+    if instruction.action.terminal or instruction.action.flush
+)
+
+# The Instructions that run code in a nested call of `run_inner()`, which
+# starts at the root Label, and then continue from the Label reached by the
+# Instruction. `THROW` returns to the innermost `CATCH`; `RET` to the
+# innermost of either.
+CALLING = frozenset([Instructions.CALL, Instructions.CALLI, Instructions.CATCH])
@@ -0,0 +1,86 @@
+# Test merging profiles and simulating them.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import os
+import tempfile
+
+import profile
+
+
+def rows(counts):
+    '''
+    Returns the rows of a profile of a two-Label interpreter: Label 0 guesses
+    `ADD` and goes to Label 1, which guesses `ADD` again.
+
+     - counts - list of `(correct_count, wrong_count)`, one per Label.
+    '''
+    return [
+        {
+            'path': path,
+            'guess': 'ADD',
+            'if_correct': 1,
+            'if_wrong': -1,
+            'correct_count': correct_count,
+            'wrong_count': wrong_count,
+        }
+        for path, (correct_count, wrong_count) in zip(['', 'ADD'], counts)
+    ]
+
+# A Label that is reached keeps non-zero counts, even when its share of the
+# merged profile rounds to zero.
+merged = profile.merge([
+    (0.1, rows([(2, 0), (1, 1)])),
+    (1.0, rows([(4, 0), (0, 0)])),
+])
+assert len(merged) == 1, merged
+_, merged_rows = merged[0]
+print(merged_rows)
+assert merged_rows[1]['correct_count'] > 0
+assert merged_rows[1]['wrong_count'] > 0
+profile.install(merged)
+next(profile.random_traces(1000))
+
+# A Label with no counts can be simulated.
+profile.install([(1.0, rows([(2, 0), (0, 0)]))])
+trace = next(profile.random_traces(1000))
+assert len(trace) == 1000
+
+# Only the previous profile decays; the current workloads keep their own
+# weights. Profiles of different interpreters are kept as separate
+# components, so that their weights can be checked.
+def write_profile(filename, guess):
+    profile.write(filename, [(1.0, [
+        dict(row, guess=guess) for row in rows([(2, 0), (1, 1)])
+    ])])
+with tempfile.TemporaryDirectory() as directory:
+    filenames = {}
+    for guess in ('ADD', 'MUL', 'NEG'):
+        filenames[guess] = os.path.join(directory, f'{guess}.json')
+        write_profile(filenames[guess], guess)
+    merged = profile.read_merged(
+        [(filenames['ADD'], 1.0), (filenames['MUL'], 1.0)],
+        previous=filenames['NEG'],
+        decay=0.25,
+    )
+weights = {labels[0]['guess']: weight for weight, labels in merged}
+print(weights)
+assert weights == {'ADD': 1.0, 'MUL': 1.0, 'NEG': 0.5}, weights
+
+# A binary profile keeps the stack moves, and omits them when they are not
+# known.
+with tempfile.TemporaryDirectory() as directory:
+    filename = os.path.join(directory, 'profile.prof')
+    written = [dict(row, correct_moves=2, wrong_moves=3) for row in rows([(2, 0), (1, 1)])]
+    profile.write(filename, [(1.0, written)], binary=True)
+    assert profile.is_binary(filename)
+    [(_, read_rows)] = profile.read(filename)
+    assert read_rows == written, read_rows
+    profile.write(filename, [(1.0, rows([(2, 0), (1, 1)]))], binary=True)
+    [(_, read_rows)] = profile.read(filename)
+    assert read_rows == rows([(2, 0), (1, 1)]), read_rows
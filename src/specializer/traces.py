@@ -0,0 +1,179 @@
+'''
+Library for reading instruction traces written by `mit --trace`.
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import gzip
+from array import array
+
+from spec import Instructions as VMInstructions, ExtraInstructions
+from specializer_spec import Instructions, INSTRUCTIONS
+from traps import LibInstructions
+
+
+# The start of a trace file, after decompression; see `mit_trace_stop()` in
+# `mit.h`.
+MAGIC = b'MitTrc3\n'
+
+# The start of a gzip file.
+GZIP_MAGIC = b'\x1f\x8b'
+
+# The Instruction index used for instructions that have no specialized
+# version, and must be executed by the fallback interpreter.
+FALLBACK = len(INSTRUCTIONS)
+
+# The opcodes whose records have an operand byte.
+VARIADIC_OPCODES = frozenset(
+    instruction.opcode
+    for instruction in VMInstructions
+    if instruction.action.action.is_variadic
+)
+OPERAND_OPCODES = VARIADIC_OPCODES | {
+    VMInstructions[name].opcode
+    for name in ('PUSH', 'JUMPZ', 'JUMP', 'CALL', 'NEXT', 'NEXTFF')
+}
+
+
+def _opcode_indices():
+    '''
+    Returns a list mapping each opcode without an operand to the index of
+    the corresponding Instruction, or `FALLBACK`.
+    '''
+    indices = [FALLBACK] * 256
+    for instruction in INSTRUCTIONS:
+        if instruction.opcode not in OPERAND_OPCODES:
+            indices[instruction.opcode] = instruction.index
+    return indices
+
+OPCODE_INDICES = _opcode_indices()
+
+# Map from `(opcode, operand)` to the index of the corresponding
+# Instruction; see `mit_trace_stop()` in `mit.h` for the operands:
+#  - the variadic Instruction for each count for which there is one.
+#  - `PUSH`, or its specialized version for the literal if there is one.
+#  - the plain and immediate forms of `JUMP` and `CALL`.
+#  - the form and branch direction of `JUMPZ`.
+#  - `NEXT` and the extra instructions.
+#  - `NEXTFF` and the `LIBC` traps.
+# The operand 255 stands for any larger value, so it has no specialized
+# Instruction.
+OPERAND_INDICES = {}
+for instruction in VMInstructions:
+    if instruction.action.action.is_variadic:
+        for count in range(0xff):
+            name = f'{instruction.name}_WITH_{count}'
+            if name in Instructions.__members__:
+                OPERAND_INDICES[(instruction.opcode, count)] = \
+                    Instructions[name].index
+for literal in range(0x100):
+    name = f'PUSH_CONST_{literal}'
+    OPERAND_INDICES[(VMInstructions.PUSH.opcode, literal)] = (
+        Instructions[name] if literal < 0xff and name in Instructions.__members__
+        else Instructions.PUSH
+    ).index
+for name in ('JUMP', 'CALL'):
+    OPERAND_INDICES[(VMInstructions[name].opcode, 0)] = Instructions[name].index
+    OPERAND_INDICES[(VMInstructions[name].opcode, 1)] = Instructions[f'{name}I'].index
+for immediate in (False, True):
+    for taken in (False, True):
+        name = f'JUMPZ{"I" if immediate else ""}_{"TAKEN" if taken else "NOT_TAKEN"}'
+        OPERAND_INDICES[(VMInstructions.JUMPZ.opcode, immediate << 1 | taken)] = \
+            Instructions[name].index
+OPERAND_INDICES[(VMInstructions.NEXT.opcode, 0)] = Instructions.NEXT.index
+for extra in ExtraInstructions:
+    if extra.name in Instructions.__members__:
+        OPERAND_INDICES[(VMInstructions.NEXT.opcode, extra.opcode)] = \
+            Instructions[extra.name].index
+OPERAND_INDICES[(VMInstructions.NEXTFF.opcode, 0xff)] = Instructions.NEXTFF.index
+for function in LibInstructions.LIBC.library:
+    if function.opcode < 0xfe:
+        OPERAND_INDICES[(VMInstructions.NEXTFF.opcode, function.opcode)] = \
+            Instructions[f'TRAP_LIBC_{function.name}'].index
+
+
+def is_trace(filename):
+    '''
+    Returns `True` if `filename` looks like a trace file.
+    '''
+    with open(filename, 'rb') as h:
+        start = h.read(len(MAGIC))
+    return start.startswith(GZIP_MAGIC) or start == MAGIC
+
+
+def _chunks(filename, chunk_bytes=1 << 20):
+    '''
+    Generates the records of a trace file as a sequence of `bytes`, reading
+    and decompressing it incrementally. A record may be split between
+    chunks.
+    '''
+    with open(filename, 'rb') as h:
+        if h.read(len(GZIP_MAGIC)) == GZIP_MAGIC:
+            h.seek(0)
+            h = gzip.open(h)
+        else:
+            h.seek(0)
+        if h.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"'{filename}' is not a trace file")
+        while True:
+            chunk = h.read(chunk_bytes)
+            if len(chunk) == 0:
+                break
+            yield chunk
+
+
+def records(filename):
+    '''
+    Generates the records of a trace file, reading it incrementally.
+    Each record is a pair `(opcode, operand)`, where `operand` is `None` if
+    the record has no operand byte.
+    '''
+    opcode = None # An opcode awaiting its operand.
+    for chunk in _chunks(filename):
+        for byte in chunk:
+            if opcode is not None:
+                yield opcode, byte
+                opcode = None
+            elif byte in OPERAND_OPCODES:
+                opcode = byte
+            else:
+                yield byte, None
+    if opcode is not None:
+        raise ValueError(f"'{filename}' is truncated")
+
+
+def traces(filename, length):
+    '''
+    Generates the instructions in a trace file as a sequence of arrays of
+    at most `length` Instruction indices (see
+    `specializer_spec.INSTRUCTIONS`), reading it incrementally. Instructions
+    with no specialized version are represented by `FALLBACK`.
+    '''
+    # This is equivalent to translating `records()`, but faster.
+    opcode_indices = OPCODE_INDICES
+    operand_indices = OPERAND_INDICES
+    operand_opcodes = OPERAND_OPCODES
+    trace = array('H')
+    opcode = None # An opcode awaiting its operand.
+    for chunk in _chunks(filename):
+        append = trace.append
+        for byte in chunk:
+            if opcode is not None:
+                append(operand_indices.get((opcode, byte), FALLBACK))
+                opcode = None
+            elif byte in operand_opcodes:
+                opcode = byte
+            else:
+                append(opcode_indices[byte])
+        for start in range(0, len(trace) - length + 1, length):
+            yield trace[start:start + length]
+        del trace[:len(trace) - len(trace) % length]
+    if opcode is not None:
+        raise ValueError(f"'{filename}' is truncated")
+    if len(trace) > 0:
+        yield trace
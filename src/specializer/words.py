@@ -0,0 +1,241 @@
+'''
+Hot instruction words of a program image.
+
+A specialized interpreter can be generated for a particular program. Its
+hot instruction words are found from samples written by `mit --sample`,
+and decoded from the program's object file into specialized Instructions.
+`gen-specializer` then generates straight-line code for each hot word,
+guarded by the value of the word, and chains it to the code for the word
+that normally follows it.
+
+(c) Mit authors 2020
+
+The package is distributed under the MIT/X11 License.
+
+THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+RISK.
+'''
+
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+from spec import opcode_bit, word_bytes, Instructions as VMInstructions
+from specializer_spec import Instructions
+
+
+def read_image(filename):
+    '''
+    Returns the words of the object file `filename`, as a list of signed
+    int, skipping any "#!" line, like `State.load()`.
+    '''
+    with open(filename, 'rb') as h:
+        data = h.read()
+    if data[:2] == b'#!':
+        newline = data.find(b'\n')
+        data = b'' if newline == -1 else data[newline + 1:]
+    if len(data) % word_bytes != 0:
+        raise ValueError(f"file '{filename}' is not a whole number of words")
+    return [
+        int.from_bytes(data[i:i + word_bytes], sys.byteorder, signed=True)
+        for i in range(0, len(data), word_bytes)
+    ]
+
+
+def hot_offsets(filename, image_words, limit):
+    '''
+    Returns the word offsets in the image of the most-sampled instruction
+    words in the samples file `filename`, most sampled first.
+
+     - image_words - int - the number of words in the image; samples
+       outside it are ignored.
+     - limit - int - the maximum number of offsets to return.
+    '''
+    base = None
+    counts = Counter()
+    with open(filename) as h:
+        for line in h:
+            fields = line.split()
+            if fields[0] == '#':
+                if fields[1:2] == ['base']:
+                    base = int(fields[2], 0)
+                continue
+            counts[int(fields[0], 0)] += 1
+    if base is None:
+        raise ValueError(f"'{filename}' does not give the base address")
+    offsets = []
+    for addr, _ in counts.most_common():
+        offset, remainder = divmod(addr - base, word_bytes)
+        if remainder == 0 and 0 <= offset < image_words:
+            offsets.append(offset)
+    return offsets[:limit]
+
+
+@dataclass
+class Step:
+    '''
+    An instruction of a Word.
+
+     - ir - int - the value of `ir` before the instruction; its least
+       significant byte is the opcode.
+     - instruction - Instructions - the specialized Instruction to execute.
+       Its guard and the stack must be checked first.
+    '''
+    ir: int
+    instruction: Instructions
+
+    def rest(self):
+        '''
+        Returns the value of `ir` after the opcode has been consumed.
+        '''
+        return self.ir >> opcode_bit
+
+
+@dataclass
+class End:
+    '''
+    A way in which a Word can finish. The guards of the Ends of a Word are
+    exclusive.
+
+     - step - Step - the final instruction.
+     - successor - int or None - the offset of the next instruction word
+       to execute, if it is known, or `None`.
+     - fetch - bool - `True` if the next instruction word is fetched after
+       `step`; `False` if the rest of `ir` must then be executed by the
+       labels.
+    '''
+    step: Step
+    successor: int = None
+    fetch: bool = True
+
+
+@dataclass
+class Word:
+    '''
+    A decoded instruction word.
+
+     - offset - int - the offset of the word in the image, in words.
+     - value - int - the value of the word.
+     - steps - list of Step - the instructions executed before any End.
+     - ends - list of End - the ways in which the word can finish. If the
+       list is empty, the labels must execute the rest of the word, starting
+       with `ir` equal to `exit_ir`.
+     - exit_ir - int - see `ends`.
+    '''
+    offset: int
+    value: int
+    steps: list = field(default_factory=list)
+    ends: list = field(default_factory=list)
+    exit_ir: int = None
+
+
+# Specialized Instructions for opcodes that need no special treatment.
+_SIMPLE = {}
+for _instruction in Instructions:
+    if (
+        _instruction.name in VMInstructions.__members__ and
+        VMInstructions[_instruction.name].action.terminal is None and
+        not _instruction.action.flush and
+        _instruction.action.guard == '1'
+    ):
+        _SIMPLE[_instruction.opcode] = _instruction
+
+# The values pushed by `PUSHI` Instructions.
+_PUSHI_VALUES = {
+    Instructions[f'PUSHI_{n}'.replace('-', 'M')]: n
+    for n in range(-32, 32)
+}
+
+# The word offsets added to `pc` by `PUSHRELI` Instructions.
+_PUSHRELI_VALUES = {
+    Instructions[f'PUSHRELI_{n}'.replace('-', 'M')]: n
+    for n in range(-64, 64)
+}
+
+# The names of variadic instructions, by opcode.
+_VARIADIC_NAMES = {
+    instruction.opcode: instruction.name
+    for instruction in VMInstructions
+    if instruction.action.action.is_variadic
+}
+
+
+def decode(image, offset, follow=True):
+    '''
+    Decodes the instruction word at `offset` in `image`, which is a list of
+    words as returned by `read_image()`. Returns a Word.
+
+    Instructions that are not worth specializing here, such as `CALL` and
+    traps, are left to the labels, as are those whose operands cannot be
+    determined: a variadic instruction's count must be pushed by the
+    previous `PUSHI`, which may end the previous word if `follow` is `True`.
+    The target of a non-immediate jump is known only if the previous
+    instruction pushed a constant address.
+    '''
+    word = Word(offset, image[offset])
+    ir = word.value
+    pc = offset + 1 # The offset to which `pc` points.
+    last = None # The previous Step, if any.
+    if follow and offset > 0:
+        previous = decode(image, offset - 1, follow=False)
+        if (
+            len(previous.steps) > 0 and
+            [end.successor for end in previous.ends] == [offset]
+        ):
+            last = previous.steps[-1]
+    last_addr = None # The offset pushed by `last`, if it is a constant address.
+    while True:
+        opcode = ir & 0xff
+        rest = ir >> opcode_bit
+        plain_rest = -1 if opcode & 0x80 != 0 else 0
+        step = None
+        addr = None
+        if opcode == VMInstructions.PUSH.opcode:
+            if pc < len(image):
+                name = f'PUSH_CONST_{image[pc]}'
+                if name not in Instructions.__members__:
+                    name = 'PUSH'
+                step = Step(ir, Instructions[name])
+                pc += 1
+        elif opcode == VMInstructions.PUSHREL.opcode:
+            if pc < len(image):
+                step = Step(ir, Instructions.PUSHREL)
+                words, remainder = divmod(image[pc], word_bytes)
+                if remainder == 0:
+                    addr = pc + words
+                pc += 1
+        elif opcode in _SIMPLE:
+            step = Step(ir, _SIMPLE[opcode])
+            if step.instruction in _PUSHRELI_VALUES:
+                addr = pc + _PUSHRELI_VALUES[step.instruction]
+        elif opcode in _VARIADIC_NAMES:
+            count = _PUSHI_VALUES.get(last and last.instruction)
+            name = f'{_VARIADIC_NAMES[opcode]}_WITH_{count}'
+            if name in Instructions.__members__:
+                step = Step(ir, Instructions[name])
+        elif opcode in (VMInstructions.NEXT.opcode, VMInstructions.NEXTFF.opcode):
+            if rest == plain_rest:
+                name = 'NEXT' if opcode == VMInstructions.NEXT.opcode else 'NEXTFF'
+                word.ends.append(End(Step(ir, Instructions[name]), pc))
+                return word
+        elif opcode == VMInstructions.JUMP.opcode:
+            if rest != plain_rest:
+                word.ends.append(End(Step(ir, Instructions.JUMPI), pc + rest))
+            else:
+                word.ends.append(End(Step(ir, Instructions.JUMP), last_addr))
+            return word
+        elif opcode == VMInstructions.JUMPZ.opcode:
+            if rest != plain_rest:
+                word.ends.append(End(Step(ir, Instructions.JUMPZI_TAKEN), pc + rest))
+                word.ends.append(End(Step(ir, Instructions.JUMPZI_NOT_TAKEN), fetch=False))
+            else:
+                word.ends.append(End(Step(ir, Instructions.JUMPZ_TAKEN), last_addr))
+                word.ends.append(End(Step(ir, Instructions.JUMPZ_NOT_TAKEN), pc))
+            return word
+        if step is None:
+            word.exit_ir = ir
+            return word
+        word.steps.append(step)
+        last, last_addr = step, addr
+        ir = rest
+
@@ -0,0 +1,146 @@
+// Instruction traces.
+//
+// The trace is accumulated in a buffer, which is written to the trace file
+// when it is full, compressed with zlib if available.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#include "config.h"
+
+#include <errno.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+#ifdef HAVE_ZLIB
+#include <zlib.h>
+#endif
+
+#include "mit/mit.h"
+
+#include "trace.h"
+
+
+MIT_THREAD_LOCAL uint8_t *trace_buffer = NULL;
+MIT_THREAD_LOCAL size_t trace_bytes = 0;
+static MIT_THREAD_LOCAL int trace_error = 0;
+
+#ifdef HAVE_ZLIB
+static MIT_THREAD_LOCAL gzFile trace_file = NULL;
+#define trace_open(fd) gzdopen(fd, "wb")
+#define trace_write(buf, len) (gzwrite(trace_file, buf, len) == (int)(len))
+#define trace_close() (gzclose(trace_file) == Z_OK)
+#else
+static MIT_THREAD_LOCAL FILE *trace_file = NULL;
+#define trace_open(fd) fdopen(fd, "wb")
+#define trace_write(buf, len) (fwrite(buf, 1, len, trace_file) == (len))
+#define trace_close() (fclose(trace_file) == 0)
+#endif
+
+int mit_trace_start(int fd)
+{
+    if (trace_file != NULL) {
+        errno = EBUSY;
+        return -1;
+    }
+    uint8_t *buffer = malloc(TRACE_BUFFER_BYTES);
+    if (buffer == NULL)
+        return -1;
+    int dup_fd = dup(fd);
+    if (dup_fd == -1) {
+        free(buffer);
+        return -1;
+    }
+    trace_file = trace_open(dup_fd);
+    if (trace_file == NULL) {
+        close(dup_fd);
+        free(buffer);
+        return -1;
+    }
+    trace_buffer = buffer;
+    memcpy(trace_buffer, MIT_TRACE_MAGIC, sizeof(MIT_TRACE_MAGIC) - 1);
+    trace_bytes = sizeof(MIT_TRACE_MAGIC) - 1;
+    trace_error = 0;
+    return 0;
+}
+
+void trace_flush(void)
+{
+    if (trace_bytes > 0 && !trace_write(trace_buffer, trace_bytes))
+        trace_error = 1;
+    trace_bytes = 0;
+}
+
+uint8_t trace_operand(mit_word_t *pc, mit_word_t ir, mit_word_t *stack, mit_uword_t stack_words, mit_uword_t stack_depth)
+{
+    uint8_t opcode = (uint8_t)ir;
+    // If `ir` has more bits, `jump`, `jumpz` and `call` are immediate.
+    int immediate = (ir & ~(mit_word_t)0xff) != 0;
+    switch (opcode) {
+    case MIT_INSTRUCTIONS_PUSH:
+        {
+            // The literal is the word at `pc`.
+            mit_uword_t literal = *pc;
+            return literal > UINT8_MAX ? UINT8_MAX : (uint8_t)literal;
+        }
+    case MIT_INSTRUCTIONS_JUMPZ:
+        {
+            // If the jump is immediate, `flag` is on top of the stack;
+            // otherwise, `addr` is on top.
+            mit_uword_t pos = immediate ? 0 : 1;
+            uint8_t operand = immediate ? 2 : 0;
+            if (stack_depth - pos - 1 < stack_words &&
+                *mit_stack_pos(stack, stack_depth, pos) == 0)
+                operand |= 1;
+            return operand;
+        }
+    case MIT_INSTRUCTIONS_JUMP:
+    case MIT_INSTRUCTIONS_CALL:
+        return immediate ? 1 : 0;
+    case MIT_INSTRUCTIONS_NEXT:
+        {
+            // The rest of `ir` is the extra opcode, or 0 for plain `next`.
+            mit_uword_t extra_opcode = (mit_uword_t)ir >> 8;
+            return extra_opcode > UINT8_MAX ? UINT8_MAX : (uint8_t)extra_opcode;
+        }
+    case MIT_INSTRUCTIONS_NEXTFF:
+        // If the rest of `ir` is all ones, this is plain `next`; if it is
+        // zero, a `LIBC` trap, whose function code is on top of the stack.
+        if (ir == -1)
+            return UINT8_MAX;
+        if (ir == MIT_INSTRUCTIONS_NEXTFF && stack_depth - 1 < stack_words) {
+            mit_uword_t function = *mit_stack_pos(stack, stack_depth, 0);
+            if (function < UINT8_MAX - 1)
+                return (uint8_t)function;
+        }
+        return UINT8_MAX - 1;
+    default:
+        {
+            // The count of a variadic instruction is on top of the stack.
+            if (stack_depth - 1 >= stack_words)
+                return UINT8_MAX;
+            mit_uword_t count = *mit_stack_pos(stack, stack_depth, 0);
+            return count > UINT8_MAX ? UINT8_MAX : count;
+        }
+    }
+}
+
+int mit_trace_stop(void)
+{
+    if (trace_file == NULL) {
+        errno = EINVAL;
+        return -1;
+    }
+    trace_flush();
+    if (!trace_close())
+        trace_error = 1;
+    trace_file = NULL;
+    free(trace_buffer);
+    trace_buffer = NULL;
+    return trace_error ? -1 : 0;
+}
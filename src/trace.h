@@ -0,0 +1,38 @@
+// Instruction trace internals shared with the instrumented interpreter.
+//
+// (c) Mit authors 2020
+//
+// The package is distributed under the MIT/X11 License.
+//
+// THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+// RISK.
+
+#ifndef MIT_TRACE_H
+#define MIT_TRACE_H
+
+
+// The size of the trace buffer, and the most bytes used by one record.
+#define TRACE_BUFFER_BYTES 65536
+#define TRACE_MAX_RECORD_BYTES 2
+
+// The trace buffer, or `NULL` if no trace is being written, and the number
+// of bytes in it.
+extern MIT_THREAD_LOCAL uint8_t *trace_buffer;
+extern MIT_THREAD_LOCAL size_t trace_bytes;
+
+// Write the contents of the trace buffer to the trace file, and empty it.
+void trace_flush(void);
+
+// Returns non-zero if the record for `opcode` has an operand byte.
+#define TRACE_HAS_OPERAND(opcode)                                       \
+    ((opcode) == MIT_INSTRUCTIONS_DUP || (opcode) == MIT_INSTRUCTIONS_SET || \
+     (opcode) == MIT_INSTRUCTIONS_SWAP || (opcode) == MIT_INSTRUCTIONS_PUSH || \
+     (opcode) == MIT_INSTRUCTIONS_JUMPZ || (opcode) == MIT_INSTRUCTIONS_JUMP || \
+     (opcode) == MIT_INSTRUCTIONS_CALL || (opcode) == MIT_INSTRUCTIONS_NEXT || \
+     (opcode) == MIT_INSTRUCTIONS_NEXTFF)
+
+// Returns the operand byte for the instruction about to be executed, whose
+// opcode is the least significant byte of `ir`, given `pc` and the stack.
+uint8_t trace_operand(mit_word_t *pc, mit_word_t ir, mit_word_t *stack, mit_uword_t stack_words, mit_uword_t stack_depth);
+
+#endif
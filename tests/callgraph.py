@@ -0,0 +1,114 @@
+# Test the call-graph profiler.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import os
+import sys
+
+from mit.globals import *
+
+
+main = M.start
+sub = M.start + 0x100
+leaf = M.start + 0x200
+thrower = M.start + 0x300
+
+# `main` calls `sub` twice, then catches an error from `thrower`.
+push(0)
+push(0)
+jumprel(sub, CALL)
+push(0)
+push(0)
+jumprel(sub, CALL)
+push(0)
+push(0)
+pushrel(thrower)
+extra(CATCH)
+ass(POP)
+ass(RET)
+
+# `sub` calls `leaf`, which executes some instructions.
+goto(sub)
+push(0)
+push(0)
+jumprel(leaf, CALL)
+ass(RET)
+
+goto(leaf)
+for _ in range(5):
+    push(1)
+    ass(POP)
+ass(RET)
+
+# `thrower` calls `leaf` then throws.
+goto(thrower)
+push(0)
+push(0)
+jumprel(leaf, CALL)
+push(1)
+extra(THROW)
+
+# Test
+FOLDED = "callgraph.folded"
+EDGES = "callgraph.edges"
+VM.run_callgraph()
+VM.save_callgraph(FOLDED)
+VM.save_callgraph(EDGES, edges=True)
+
+stacks = {}
+with open(FOLDED) as h:
+    for line in h:
+        stack, count = line.split()
+        frames = tuple(int(frame, 16) for frame in stack.split(';'))
+        stacks[frames] = stacks.get(frames, 0) + int(count)
+edges = {}
+with open(EDGES) as h:
+    assert h.readline().startswith('#')
+    for line in h:
+        ret_pc, addr, *counts = (int(field, 0) for field in line.split())
+        edges.setdefault(addr, []).append(counts)
+os.remove(FOLDED)
+os.remove(EDGES)
+
+print(f"Stacks: {stacks}")
+print(f"Edges: {edges}")
+paths = set(stacks.keys())
+expected_paths = {
+    (main,),
+    (main, sub),
+    (main, sub, leaf),
+    (main, thrower),
+    (main, thrower, leaf),
+}
+if paths != expected_paths:
+    print("Error in call-graph tests: wrong call paths")
+    sys.exit(1)
+
+# Each call of `leaf` runs the same instructions.
+leaf_count = stacks[(main, sub, leaf)] // 2
+if stacks[(main, thrower, leaf)] != leaf_count:
+    print("Error in call-graph tests: wrong instruction counts for `leaf`")
+    sys.exit(1)
+
+# `sub` is called once from each of two sites, and its inclusive count
+# includes `leaf`.
+if len(edges[sub]) != 2:
+    print("Error in call-graph tests: wrong call edges for `sub`")
+    sys.exit(1)
+calls, inclusive, exclusive = (sum(column) for column in list(zip(*edges[sub]))[:3])
+if calls != 2 or exclusive != stacks[(main, sub)] or inclusive != exclusive + 2 * leaf_count:
+    print("Error in call-graph tests: wrong costs for `sub`")
+    sys.exit(1)
+
+# The outermost run includes everything.
+[[calls, inclusive, exclusive, _, _]] = edges[main]
+if calls != 1 or inclusive != sum(stacks.values()):
+    print("Error in call-graph tests: wrong costs for `main`")
+    sys.exit(1)
+
+print("Call-graph tests ran OK")
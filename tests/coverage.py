@@ -0,0 +1,69 @@
+# Test coverage recording.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import io
+import os
+import sys
+
+from mit.globals import *
+from mit.coverage import Coverage
+
+
+# Code: `main` jumps to `end`, skipping `other`.
+main = M.start
+other = M.start + 0x40
+end = M.start + 0x80
+jumprel(end)
+goto(other)
+ass(RET)
+goto(end)
+ass(RET)
+
+def word(addr):
+    return (addr - M.start) // word_bytes
+
+def covered(coverage):
+    return {i for i in range(coverage.words) if i in coverage}
+
+# Test
+COVERAGE = "coverage.bitmap"
+VM.run_coverage()
+main_coverage = VM.coverage()
+print(f"Words covered from `main`: {covered(main_coverage)}")
+if covered(main_coverage) != {word(main), word(end)}:
+    print("Error in coverage tests: wrong coverage from `main`")
+    sys.exit(1)
+
+# Save and reload the coverage.
+VM.save_coverage(COVERAGE)
+loaded = Coverage.load(COVERAGE)
+os.remove(COVERAGE)
+if loaded.words != main_coverage.words or loaded.bits != main_coverage.bits:
+    print("Error in coverage tests: saved coverage differs")
+    sys.exit(1)
+
+# Merge with a run from `other`.
+VM.pc = other
+VM.run_coverage()
+loaded.merge(VM.coverage())
+if covered(loaded) != {word(main), word(other), word(end)} or loaded.count() != 3:
+    print("Error in coverage tests: wrong merged coverage")
+    sys.exit(1)
+
+listing = io.StringIO()
+length = word(end) + 1
+loaded.annotate(VM, length=length, file=listing)
+print(listing.getvalue())
+lines = listing.getvalue().splitlines()
+if (not lines[0].startswith('+') or not lines[1].startswith('-') or
+    not lines[-1].startswith(f'3 of {length} words executed')):
+    print("Error in coverage tests: wrong annotated disassembly")
+    sys.exit(1)
+
+print("Coverage tests ran OK")
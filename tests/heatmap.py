@@ -0,0 +1,85 @@
+# Test the memory heatmap.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import io
+import os
+import sys
+from ctypes import addressof, create_string_buffer
+
+from mit.globals import *
+from mit.heatmap import Heatmap
+
+
+SHIFT = 6
+word_addr = M.start + 0x1000
+byte_addr = M.start + 0x1041
+half_addr = M.start + 0x2000
+other = create_string_buffer(word_bytes)
+other_addr = addressof(other)
+
+# Code
+push(42)
+push(word_addr)
+ass(STORE)
+for _ in range(2):
+    push(byte_addr)
+    ass(LOAD1)
+    ass(POP)
+push(7)
+push(half_addr)
+ass(STORE2)
+push(other_addr)
+ass(LOAD)
+ass(POP)
+ass(RET)
+
+# Test
+HEATMAP = "heatmap.counts"
+VM.run_heatmap(shift=SHIFT)
+heatmap = VM.heatmap()
+VM.save_heatmap(HEATMAP)
+loaded = Heatmap.load(HEATMAP)
+os.remove(HEATMAP)
+report = io.StringIO()
+heatmap.report(file=report)
+print(report.getvalue())
+
+def region(addr):
+    return (addr - M.start) >> SHIFT
+
+# The code is read by the interpreter, not by `load`, so is not counted.
+expected = {
+    region(word_addr): ([0, 0, 0, 0], [0, 0, 0, 1]),
+    region(byte_addr): ([2, 0, 0, 0], [0, 0, 0, 0]),
+    region(half_addr): ([0, 0, 0, 0], [0, 1, 0, 0]),
+    heatmap.regions(): ([0, 0, 0, 1], [0, 0, 0, 0]),
+}
+for hm in heatmap, loaded:
+    counts = {
+        i: (hm.reads(i), hm.writes(i))
+        for i in range(hm.regions() + 1)
+        if sum(hm.reads(i) + hm.writes(i)) > 0
+    }
+    if hm.regions() != len(M) >> SHIFT or counts != expected:
+        print(f"Error in heatmap tests: wrong counts {counts}")
+        sys.exit(1)
+if heatmap.hottest(1) != [region(byte_addr)]:
+    print("Error in heatmap tests: wrong hottest region")
+    sys.exit(1)
+
+try:
+    import numpy
+    reads, writes = heatmap.to_numpy()
+    if reads.shape != (heatmap.regions() + 1, 4) or reads[region(byte_addr)][0] != 2 or writes.sum() != 2:
+        print("Error in heatmap tests: wrong NumPy arrays")
+        sys.exit(1)
+except ImportError:
+    pass
+
+print("Heatmap tests ran OK")
@@ -0,0 +1,70 @@
+# Test the stack high-water mark.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import sys
+
+from mit.globals import *
+
+
+main = M.start
+sub = M.start + 0x100
+leaf = M.start + 0x200
+thrower = M.start + 0x300
+leaf_thrower = M.start + 0x400
+
+# `main` reaches a depth of 5, then catches an error thrown two calls deep,
+# then makes two nested calls.
+for i in range(5):
+    push(i)
+for _ in range(5):
+    ass(POP)
+push(0)
+push(0)
+pushrel(thrower)
+extra(CATCH)
+ass(POP)
+push(0)
+push(0)
+jumprel(sub, CALL)
+ass(RET)
+
+goto(sub)
+push(0)
+push(0)
+jumprel(leaf, CALL)
+ass(RET)
+
+goto(leaf)
+for i in range(3):
+    push(i)
+ass(RET)
+
+goto(thrower)
+push(0)
+push(0)
+jumprel(leaf_thrower, CALL)
+ass(RET)
+
+goto(leaf_thrower)
+push(1)
+extra(THROW)
+
+# Test
+VM.run_highwater()
+depth, calls = VM.highwater()
+print(f"Greatest stack depth {depth}, greatest call nesting {calls}")
+if depth != 5:
+    print("Error in high-water mark tests: wrong stack depth")
+    sys.exit(1)
+# If the error unwound the nesting wrongly, it would be 3.
+if calls != 2:
+    print("Error in high-water mark tests: wrong call nesting")
+    sys.exit(1)
+
+print("High-water mark tests ran OK")
@@ -0,0 +1,73 @@
+# Test the sampling profiler.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import io
+import os
+import sys
+
+from mit.globals import *
+from mit.sampling import Samples
+
+
+main = M.start
+sub = M.start + 0x100
+code_end = M.start + 0x200
+
+# Run `body` repeatedly, counting down the counter on top of the stack to
+# zero, then drop the counter.
+def countdown(body):
+    loop = label()
+    body()
+    push(-1)
+    ass(ADD)
+    push(0)
+    ass(DUP)
+    done = loop + 0x80
+    pushrel(done)
+    ass(JUMPZ)
+    jumprel(loop)
+    goto(done)
+    ass(POP)
+
+# `main` calls `sub` repeatedly; `sub` does most of the work.
+push(200)
+def call_sub():
+    push(0)
+    push(0)
+    jumprel(sub, CALL)
+countdown(call_sub)
+ass(RET)
+
+goto(sub)
+push(100000)
+countdown(lambda: None)
+ass(RET)
+
+# Test
+SAMPLES = "sampling.samples"
+VM.run_sample(interval=1000)
+VM.save_samples(SAMPLES)
+samples = Samples.load(SAMPLES)
+os.remove(SAMPLES)
+report = io.StringIO()
+samples.report(VM, file=report)
+print(report.getvalue())
+
+if len(samples.samples) == 0 or samples.dropped != 0 or samples.base != M.start:
+    print("Error in sampling tests: wrong number of samples")
+    sys.exit(1)
+if not all(main <= addr < code_end for addr in samples.addresses()):
+    print("Error in sampling tests: sample outside code")
+    sys.exit(1)
+depths = samples.depths()
+if set(depths) - {0, 1} or depths[1] < depths[0]:
+    print("Error in sampling tests: wrong call depths")
+    sys.exit(1)
+
+print("Sampling tests ran OK")
@@ -0,0 +1,86 @@
+# Test instruction traces.
+#
+# (c) Mit authors 2020
+#
+# The package is distributed under the MIT/X11 License.
+#
+# THIS PROGRAM IS PROVIDED AS IS, WITH NO WARRANTY. USE IS AT THE USER’S
+# RISK.
+
+import gzip
+import os
+import sys
+
+from mit.globals import *
+
+
+main = M.start
+target = M.start + 0x100
+end = M.start + 0x200
+
+# Code
+push(7)
+push(3)
+extra(DIVMOD)
+push(LibC.STDOUT)
+trap(LIBC)
+push(200)
+push(1000)
+push(1)
+ass(DUP)
+push(0)
+jumprel(target, JUMPZ) # Immediate, taken.
+
+goto(target)
+push(1)
+pushrel(end)
+ass(JUMPZ) # Not taken.
+ass(RET)
+
+goto(end)
+ass(RET)
+
+# Test
+TRACE = "trace.bin"
+VM.run_trace(TRACE)
+with open(TRACE, 'rb') as h:
+    data = h.read()
+os.remove(TRACE)
+if data[:2] == b'\x1f\x8b':
+    data = gzip.decompress(data)
+if data[:8] != b'MitTrc3\n':
+    print("Error in trace tests: bad magic")
+    sys.exit(1)
+
+records = []
+i = 8
+while i < len(data):
+    opcode = data[i]
+    i += 1
+    operand = None
+    if opcode in (DUP, SET, SWAP, PUSH, JUMPZ, JUMP, CALL, NEXT, NEXTFF):
+        operand = data[i]
+        i += 1
+    records.append((opcode, operand))
+print(records)
+
+with_operands = [
+    record for record in records
+    if record[1] is not None and record[0] not in (NEXT, NEXTFF)
+]
+if with_operands != [(PUSH, 200), (PUSH, 255), (DUP, 1), (JUMPZ, 3), (JUMPZ, 0)]:
+    print(f"Error in trace tests: wrong operands {with_operands}")
+    sys.exit(1)
+extras = [record for record in records if record[0] == NEXT and record[1] != 0]
+if extras != [(NEXT, DIVMOD)]:
+    print(f"Error in trace tests: wrong extra instructions {extras}")
+    sys.exit(1)
+traps = [record for record in records if record[0] == NEXTFF]
+if traps != [(NEXTFF, LibC.STDOUT)]:
+    print(f"Error in trace tests: wrong traps {traps}")
+    sys.exit(1)
+if records[-1] != (RET, None) or records.count((RET, None)) != 1:
+    print("Error in trace tests: trace does not end with `ret`")
+    sys.exit(1)
+
+print("Trace tests ran OK")